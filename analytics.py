@@ -0,0 +1,114 @@
+"""Vectorized sales analytics on columnar NumPy arrays.
+
+The report fetches its grouped sales rows in one statement (see
+report_sales_groups in app.py) and turns them into arrays here. Groupings,
+margins, sell-through rates and trends are array operations on those
+columns, so a new breakdown adds no database round trip.
+"""
+
+import numpy as np
+
+WEEKDAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+
+
+def to_columns(rows, dtypes):
+    """Split row tuples into one array per column"""
+    if not rows:
+        return [np.array([], dtype=dtype) for dtype in dtypes]
+    return [np.array(column, dtype=dtype) for column, dtype in zip(zip(*rows), dtypes)]
+
+
+def encode(values):
+    """Integer code per value and the distinct values in code order.
+
+    Works for any hashable values, None included, which np.unique can't sort.
+    """
+    codes = {}
+    encoded = np.fromiter(
+        (codes.setdefault(value, len(codes)) for value in values.tolist()),
+        dtype=np.int64,
+        count=len(values),
+    )
+    return encoded, list(codes)
+
+
+def group_sums(codes, group_count, *columns):
+    """Sum each column per group code, keeping integer columns integral"""
+    return [
+        np.bincount(codes, weights=column, minlength=group_count).astype(column.dtype)
+        for column in columns
+    ]
+
+
+def ratio(numerator, denominator):
+    """numerator / denominator, NaN where the denominator is 0"""
+    result = np.full(len(numerator), np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def margins(profit, revenue):
+    return ratio(profit, revenue)
+
+
+def sell_through(units_sold, on_hand):
+    """Share of the units available over the period that sold"""
+    return ratio(units_sold, units_sold + on_hand)
+
+
+def to_list(values):
+    """Python list of the array's values with NaN as None"""
+    if values.dtype.kind == "f":
+        return [None if np.isnan(value) else value for value in values.tolist()]
+    return values.tolist()
+
+
+def breakdown(keys, measures):
+    """Totals, margin and sell-through per distinct key.
+
+    measures are the sales_count, units, revenue, cost, profit and on_hand
+    columns. Returns (key, sales_count, units, revenue, cost, profit, margin,
+    sell_through) rows for the keys that had sales.
+    """
+    codes, labels = encode(keys)
+    sales_count, units, revenue, cost, profit, on_hand = group_sums(
+        codes, len(labels), *measures
+    )
+    columns = [
+        to_list(column)
+        for column in (
+            sales_count,
+            units,
+            revenue,
+            cost,
+            profit,
+            margins(profit, revenue),
+            sell_through(units, on_hand),
+        )
+    ]
+    return [row for row in zip(labels, *columns) if row[1]]
+
+
+def trailing_mean(dates, values, start, window):
+    """Mean of values over the `window` calendar days up to each date.
+
+    Days without sales count as 0. The first days after start average the
+    days available so far.
+    """
+    offsets = (dates - np.datetime64(start, "D")).astype(np.int64)
+    sums = np.cumsum(np.bincount(offsets, weights=values))
+    sums[window:] = sums[window:] - sums[:-window]
+    return (sums / np.minimum(np.arange(1, len(sums) + 1), window))[offsets]
+
+
+def weekdays(dates):
+    """Weekday codes, 0 for Monday (1970-01-01 was a Thursday)"""
+    return (dates.astype(np.int64) + 3) % 7
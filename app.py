@@ -1,12 +1,20 @@
 from flask import (
     Flask,
+    before_render_template,
+    g,
+    has_request_context,
     jsonify,
     render_template,
     request,
     redirect,
     url_for,
     flash,
+    make_response,
     Response,
+    send_file,
+    session,
+    stream_with_context,
+    template_rendered,
 )
 from flask_login import (
     LoginManager,
@@ -18,31 +26,184 @@ from flask_login import (
 )
 from flask_bcrypt import Bcrypt
 from flask_migrate import Migrate
+import click
 import csv
-from io import StringIO
-from collections import defaultdict
+import hashlib
+import hmac
+from io import StringIO, TextIOWrapper
+from collections import OrderedDict, defaultdict, deque, namedtuple
 from flask_sqlalchemy import SQLAlchemy
 import os
-from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+import re
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import DDL, and_, case, event, func, desc, or_
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import selectinload
 from functools import wraps
-
+from markupsafe import Markup
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy.pool import QueuePool
+import numpy as np
+import analytics
 
 app = Flask(__name__)
 
 app.secret_key = "some-secret-key"  # needed for flash messages
 
+# Prometheus metrics. Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in
+# gunicorn.conf.py) makes every worker write its samples to files in that
+# directory, which /metrics aggregates across workers.
+REQUEST_LATENCY = Histogram(
+    "zuzi_request_duration_seconds",
+    "Request latency by endpoint",
+    ["endpoint", "method"],
+)
+REQUESTS = Counter(
+    "zuzi_requests_total",
+    "Requests by endpoint and status",
+    ["endpoint", "method", "status"],
+)
+DB_POOL_CHECKOUTS = Counter(
+    "zuzi_db_pool_checkouts_total", "Connections checked out of the pool"
+)
+DB_POOL_WAIT = Histogram(
+    "zuzi_db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_IN_USE = Gauge(
+    "zuzi_db_pool_connections_in_use",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "zuzi_cache_lookups_total", "Cache lookups by cache", ["cache", "result"]
+)
+SALES_RECORDED = Counter("zuzi_sales_recorded_total", "Sales recorded")
+UNITS_SOLD = Counter("zuzi_units_sold_total", "Units sold")
+SALES_REVERTED = Counter("zuzi_sales_reverted_total", "Sales reverted")
+STOCK_OUTS = Counter(
+    "zuzi_stock_outs_total", "Sell attempts rejected for lack of stock"
+)
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records checkouts and the time spent waiting for one"""
+
+    def connect(self):
+        start = time.perf_counter()
+        connection = super().connect()
+        DB_POOL_WAIT.observe(time.perf_counter() - start)
+        DB_POOL_CHECKOUTS.inc()
+        return connection
+
+
+@event.listens_for(MeteredQueuePool, "checkout")
+def pool_connection_checked_out(dbapi_connection, connection_record, proxy):
+    DB_POOL_IN_USE.inc()
+
+
+@event.listens_for(MeteredQueuePool, "checkin")
+def pool_connection_checked_in(dbapi_connection, connection_record):
+    DB_POOL_IN_USE.dec()
+
+
 # Database configuration - works for both local development and production
 database_url = os.environ.get("DATABASE_URL")
 if database_url:
-    # Production (Render) - PostgreSQL
+    # Production (Render) - PostgreSQL. Any other URL (e.g. a SQLite file for
+    # benchmarks) is used as is; DATABASE_SSLMODE relaxes SSL for a local
+    # Postgres.
     app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"sslmode": "require"}}
+    if database_url.startswith("postgres"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "connect_args": {"sslmode": os.environ.get("DATABASE_SSLMODE", "require")}
+        }
+    else:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
 else:
     # Local development - SQLite
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///zuzi_store.db"
     app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
 
+# Connection pool settings, tunable from the environment. Every file-backed
+# database gets a metered pool; in-memory SQLite keeps its single connection.
+is_postgres = app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgres")
+if not re.match(r"sqlite://(/:memory:)?$", app.config["SQLALCHEMY_DATABASE_URI"]):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+        poolclass=MeteredQueuePool,
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        # Postgres connections can be closed under us by the server or a
+        # proxy, so recycle them and check them before use
+        pool_recycle=int(
+            os.environ.get("DB_POOL_RECYCLE", 1800 if is_postgres else -1)
+        ),
+        pool_pre_ping=os.environ.get("DB_POOL_PRE_PING", "1" if is_postgres else "0")
+        == "1",
+    )
+
+# SQLite: WAL lets readers carry on while a sell commits, and synchronous=NORMAL
+# is durable enough in WAL mode; writers wait up to the busy timeout for a lock
+app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(
+    os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)
+)
+
+
+@event.listens_for(Engine, "connect")
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+        cursor.close()
+
+
+def describe_engine_settings():
+    """One line summary of the effective database settings"""
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+    settings = [url.render_as_string(hide_password=True)]
+    if "poolclass" in options:
+        settings += [
+            f"{name}={options[name]}"
+            for name in (
+                "pool_size",
+                "max_overflow",
+                "pool_timeout",
+                "pool_recycle",
+                "pool_pre_ping",
+            )
+        ]
+    if url.get_backend_name() == "sqlite":
+        settings += [
+            f"journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+            f"synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+            f"busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}ms",
+        ]
+    return ", ".join(settings)
+
+
+app.logger.info("Database engine: %s", describe_engine_settings())
+
 # Optional: Disable SQLAlchemy modification tracking for better performance
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
@@ -59,9 +220,46 @@ app.config["REMEMBER_COOKIE_REFRESH_EACH_REQUEST"] = (
 # Session configuration
 app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=30)
 
+# Aggregate cache: entries expire after the TTL and are dropped on every
+# write. Set CACHE_SHARED_PATH to a SQLite file so all gunicorn workers on
+# the host share invalidations.
+app.config["CACHE_TTL_SECONDS"] = int(os.environ.get("CACHE_TTL_SECONDS", 300))
+app.config["CACHE_MAX_ENTRIES"] = int(os.environ.get("CACHE_MAX_ENTRIES", 256))
+app.config["CACHE_SHARED_PATH"] = os.environ.get("CACHE_SHARED_PATH")
+app.config["USER_CACHE_TTL_SECONDS"] = int(os.environ.get("USER_CACHE_TTL_SECONDS", 60))
+app.config["USER_CACHE_MAX_ENTRIES"] = int(
+    os.environ.get("USER_CACHE_MAX_ENTRIES", 1024)
+)
+
+app.config["FRAGMENT_CACHE_MAX_ENTRIES"] = int(
+    os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", 4096)
+)
+
+# bcrypt work factor for new password hashes (Flask-Bcrypt reads this key).
+# Hashes made with another factor are rehashed on the user's next login.
+app.config["BCRYPT_LOG_ROUNDS"] = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+
+# A size with this many units or fewer left is low on stock
+app.config["LOW_STOCK_THRESHOLD"] = int(os.environ.get("LOW_STOCK_THRESHOLD", 1))
+
+# Opt-in request profiling (PROFILE_REQUESTS=1): per-endpoint query count,
+# DB time, render time and total time, with a log line for slow requests
+app.config["PROFILE_REQUESTS"] = os.environ.get("PROFILE_REQUESTS") == "1"
+app.config["SLOW_REQUEST_MS"] = float(os.environ.get("SLOW_REQUEST_MS", 500))
+app.config["PROFILE_WINDOW"] = int(os.environ.get("PROFILE_WINDOW", 200))
+
 
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)  # Initialize Flask-Migrate here
+
+
+def include_in_migrations(name, type_, parent_names):
+    """Keep autogenerate away from the SQLite FTS5 search index tables"""
+    return not (type_ == "table" and name.startswith("product_search_fts"))
+
+
+migrate = Migrate(
+    app, db, include_name=include_in_migrations
+)  # Initialize Flask-Migrate here
 
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
@@ -69,9 +267,22 @@ login_manager.login_view = "login"
 bcrypt = Bcrypt(app)
 
 
+def load_detached_user(user_id):
+    user = db.session.get(User, user_id)
+    if user is not None:
+        # Cached outside any session; each request merges in its own copy
+        db.session.expunge(user)
+    return user
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    user = user_cache.get_or_compute(user_id, lambda: load_detached_user(user_id))
+    if user is None:
+        return None
+    # load=False attaches a copy without querying the database
+    return db.session.merge(user, load=False)
 
 
 # Define models
@@ -85,12 +296,30 @@ class Product(db.Model):
     unit_cost = db.Column(db.Float)
     selling_price = db.Column(db.Float)
     # New categorization fields
-    season = db.Column(db.String(50), nullable=False)  # Summer, Winter, Spring/Autumn
-    gender = db.Column(db.String(50), nullable=False)  # Boys, Girls
+    season = db.Column(
+        db.String(50), nullable=False, index=True
+    )  # Summer, Winter, Spring/Autumn
+    gender = db.Column(db.String(50), nullable=False, index=True)  # Boys, Girls
+    # Catalog version of the last change to the product or its stock
+    version = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
+    )
+    # Units in stock across all sizes, kept by refresh_stock_totals
+    total_units = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
+    )
     sizes = db.relationship("SizeQuantity", backref="product", cascade="all, delete")
 
 
 class SizeQuantity(db.Model):
+    # (product_id, size) serves both the per-product size lookups in
+    # sell/revert and the product_id join, so no separate product_id index
+    __table_args__ = (
+        db.Index("ix_size_quantity_product_id_size", "product_id", "size"),
+        # Low-stock lists are a range scan of this index
+        db.Index("ix_size_quantity_quantity", "quantity"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     size = db.Column(db.String(50))
     quantity = db.Column(db.Integer)
@@ -98,13 +327,30 @@ class SizeQuantity(db.Model):
 
 
 class Sale(db.Model):
+    # Reports, exports and recent sales only read live sales by timestamp;
+    # the partial index leaves reverted sales out
+    __table_args__ = (
+        db.Index(
+            "ix_sale_live_timestamp",
+            "timestamp",
+            sqlite_where=db.text("reverted_at IS NULL"),
+            postgresql_where=db.text("reverted_at IS NULL"),
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey("product.id"))
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), index=True)
     size = db.Column(db.String(50))
     quantity = db.Column(db.Integer)
     selling_price = db.Column(db.Float)
     unit_cost = db.Column(db.Float)
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # Set by revert_sale together with the SaleRevert record
+    reverted_at = db.Column(db.DateTime)
+
+    @property
+    def is_reverted(self):
+        return self.reverted_at is not None
 
 
 class User(UserMixin, db.Model):
@@ -116,11 +362,21 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return bcrypt.check_password_hash(self.password_hash, password)
 
+    def set_password(self, password):
+        self.password_hash = bcrypt.generate_password_hash(password).decode("utf-8")
+
+    def needs_rehash(self):
+        # bcrypt hashes look like $2b$<rounds>$<salt and hash>
+        return int(self.password_hash.split("$")[2]) != app.config["BCRYPT_LOG_ROUNDS"]
+
     def is_admin(self):
         return self.role == "admin"
 
 
 class SaleRevert(db.Model):
+    # A sale can only be reverted once
+    __table_args__ = (db.UniqueConstraint("sale_id", name="uq_sale_revert_sale_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     sale_id = db.Column(db.Integer, db.ForeignKey("sale.id"), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
@@ -128,11 +384,627 @@ class SaleRevert(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     selling_price = db.Column(db.Float, nullable=False)
     unit_cost = db.Column(db.Float, nullable=False)
-    revert_timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
+    revert_timestamp = db.Column(
+        db.DateTime, default=db.func.current_timestamp(), index=True
+    )
     reverted_by = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     reason = db.Column(db.String(500))  # Optional reason for the revert
 
 
+class DailySalesRollup(db.Model):
+    """Non-reverted sales totals per day, product and size.
+
+    Kept up to date by sell_product/revert_sale so the report reads a few
+    rows per day instead of every raw Sale.
+    """
+
+    __tablename__ = "daily_sales_rollup"
+    # Leading sale_date lets the report range-scan this constraint's index
+    __table_args__ = (
+        db.UniqueConstraint(
+            "sale_date", "product_id", "size", name="uq_daily_sales_rollup_key"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sale_date = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    size = db.Column(db.String(50))
+    sales_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0)
+    profit = db.Column(db.Float, nullable=False, default=0)
+
+
+ROLLUP_TOTAL_COLUMNS = ("sales_count", "units", "revenue", "cost", "profit")
+
+
+def update_sales_rollup(sale, sign=1):
+    """Add (sign=1) or remove (sign=-1) a sale from its daily rollup row.
+
+    Uses INSERT ... ON CONFLICT DO UPDATE so concurrent sells of the same
+    product/size on the same day increment one row instead of racing.
+    """
+    values = {
+        "sale_date": sale.timestamp.date(),
+        "product_id": sale.product_id,
+        "size": sale.size,
+        "sales_count": sign,
+        "units": sign * sale.quantity,
+        "revenue": sign * sale.selling_price * sale.quantity,
+        "cost": sign * sale.unit_cost * sale.quantity,
+        "profit": sign * (sale.selling_price - sale.unit_cost) * sale.quantity,
+    }
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        insert = postgresql.insert
+    else:
+        insert = sqlite.insert
+
+    stmt = insert(DailySalesRollup).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sale_date", "product_id", "size"],
+        set_={
+            column: getattr(DailySalesRollup, column) + getattr(stmt.excluded, column)
+            for column in ROLLUP_TOTAL_COLUMNS
+        },
+    )
+    db.session.execute(stmt)
+
+    if sign < 0:
+        # Drop rows whose every sale has been reverted, matching the raw query
+        DailySalesRollup.query.filter_by(
+            sale_date=values["sale_date"],
+            product_id=sale.product_id,
+            size=sale.size,
+        ).filter(DailySalesRollup.sales_count <= 0).delete()
+
+
+def rebuild_sales_rollup():
+    """Recompute daily_sales_rollup from the raw non-reverted sales"""
+    DailySalesRollup.query.delete()
+
+    totals = (
+        db.session.query(
+            func.date(Sale.timestamp),
+            Sale.product_id,
+            Sale.size,
+            func.count(Sale.id),
+            func.sum(Sale.quantity),
+            func.sum(Sale.selling_price * Sale.quantity),
+            func.sum(Sale.unit_cost * Sale.quantity),
+            func.sum((Sale.selling_price - Sale.unit_cost) * Sale.quantity),
+        )
+        .filter(Sale.reverted_at.is_(None))
+        .group_by(func.date(Sale.timestamp), Sale.product_id, Sale.size)
+    )
+    db.session.execute(
+        DailySalesRollup.__table__.insert().from_select(
+            ["sale_date", "product_id", "size", *ROLLUP_TOTAL_COLUMNS],
+            totals.statement,
+        )
+    )
+    db.session.commit()
+    query_cache.invalidate()
+
+    return DailySalesRollup.query.count()
+
+
+def decrement_stock(product_id, size, quantity):
+    """Atomically take units of a size out of stock.
+
+    Runs a single conditional UPDATE (quantity >= n), so the row lock the
+    database takes for the write serializes concurrent sells. Returns True
+    if there was enough stock and it has been decremented.
+    """
+    result = db.session.execute(
+        db.update(SizeQuantity)
+        .where(
+            SizeQuantity.product_id == product_id,
+            SizeQuantity.size == size,
+            SizeQuantity.quantity >= quantity,
+        )
+        .values(quantity=SizeQuantity.quantity - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def increment_stock(size_id, quantity):
+    """Atomically put units of a size row back into stock.
+
+    A single UPDATE (quantity = quantity + n), like decrement_stock, so it
+    never overwrites a concurrent sell's decrement.
+    """
+    db.session.execute(
+        db.update(SizeQuantity)
+        .where(SizeQuantity.id == size_id)
+        .values(quantity=SizeQuantity.quantity + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def mark_sale_reverted(sale_id):
+    """Atomically flag a live sale as reverted.
+
+    A single conditional UPDATE (reverted_at IS NULL), like decrement_stock,
+    so of two concurrent reverts of the same sale only one succeeds.
+    Returns True if the sale was live and is now marked reverted.
+    """
+    result = db.session.execute(
+        db.update(Sale)
+        .where(Sale.id == sale_id, Sale.reverted_at.is_(None))
+        .values(reverted_at=db.func.current_timestamp())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+class CatalogVersion(db.Model):
+    """Single-row counter bumped by every change to the product catalog"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)  # UTC
+
+
+event.listen(
+    CatalogVersion.__table__,
+    "after_create",
+    DDL(
+        "INSERT INTO catalog_version (id, value, updated_at) "
+        "VALUES (1, 0, CURRENT_TIMESTAMP)"
+    ),
+)
+
+
+class DeletedProduct(db.Model):
+    """Tombstone telling inventory syncs that a product was deleted"""
+
+    product_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+
+
+def bump_product_versions(product_ids):
+    """Stamp products with a new catalog version; call just before commit.
+
+    The counter row stays locked until the transaction commits, so versions
+    become visible in increasing order. Pass no ids for a change that only
+    removes products.
+    """
+    version = db.session.execute(
+        db.update(CatalogVersion)
+        .where(CatalogVersion.id == 1)
+        .values(
+            value=CatalogVersion.value + 1,
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+        )
+        .returning(CatalogVersion.value)
+    ).scalar_one()
+    product_ids = list(product_ids)
+    if product_ids:
+        db.session.execute(
+            db.update(Product)
+            .where(Product.id.in_(product_ids))
+            .values(version=version)
+            .execution_options(synchronize_session=False)
+        )
+    return version
+
+
+def update_product_sizes(product_id, sizes):
+    """Bring a product's size rows in line with a {size: quantity} dict.
+
+    Issues only the needed statements: one batched UPDATE for changed
+    quantities, one INSERT for new sizes and one DELETE for removed ones.
+    Unchanged rows keep their ids.
+    """
+    existing = {}
+    removed_ids = []
+    for size_id, size, quantity in db.session.query(
+        SizeQuantity.id, SizeQuantity.size, SizeQuantity.quantity
+    ).filter(SizeQuantity.product_id == product_id):
+        if size in sizes and size not in existing:
+            existing[size] = (size_id, quantity)
+        else:
+            removed_ids.append(size_id)  # Dropped, or a duplicate row
+
+    changed = [
+        {"id": existing[size][0], "quantity": quantity}
+        for size, quantity in sizes.items()
+        if size in existing and existing[size][1] != quantity
+    ]
+    added = [
+        {"product_id": product_id, "size": size, "quantity": quantity}
+        for size, quantity in sizes.items()
+        if size not in existing
+    ]
+
+    if changed:
+        db.session.execute(db.update(SizeQuantity), changed)
+    if added:
+        db.session.execute(db.insert(SizeQuantity), added)
+    if removed_ids:
+        db.session.execute(
+            db.delete(SizeQuantity)
+            .where(SizeQuantity.id.in_(removed_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def refresh_stock_totals(product_ids):
+    """Recompute the total_units of the given products from their sizes.
+
+    Call wherever stock changes, before committing (next to
+    bump_product_versions).
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(product_ids))
+        .values(
+            total_units=db.select(func.coalesce(func.sum(SizeQuantity.quantity), 0))
+            .where(SizeQuantity.product_id == Product.id)
+            .scalar_subquery()
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def low_stock_query(threshold=None):
+    """(Product, SizeQuantity) pairs of the sizes at or below the threshold"""
+    if threshold is None:
+        threshold = app.config["LOW_STOCK_THRESHOLD"]
+    return (
+        db.session.query(Product, SizeQuantity)
+        .join(SizeQuantity)
+        .filter(SizeQuantity.quantity <= threshold)
+    )
+
+
+@app.cli.command("backfill-sales-rollup")
+def backfill_sales_rollup():
+    """Rebuild the daily sales rollup table from the sales history"""
+    rows = rebuild_sales_rollup()
+    print(f"Daily sales rollup rebuilt: {rows} rows.")
+
+
+USD_TO_IQD = 1400
+
+PRODUCT_SEASONS = ("Summer", "Winter", "Spring/Autumn")
+PRODUCT_GENDERS = ("Boys", "Girls")
+
+
+def calculate_pricing(total_cost_usd, shipping_cost_usd, total_units):
+    """Convert USD costs to IQD and derive the unit cost and selling price"""
+    total_cost = total_cost_usd * USD_TO_IQD
+    shipping_cost = shipping_cost_usd * USD_TO_IQD
+
+    unit_cost = (total_cost + shipping_cost) / total_units
+
+    selling_price = int(
+        round((unit_cost + 7000) / 1000) * 1000
+    )  # Round to nearest 1000 IQD
+
+    return total_cost, shipping_cost, unit_cost, selling_price
+
+
+# Bulk product import: products inserted (and committed) per batch
+IMPORT_BATCH_SIZE = 500
+IMPORT_COLUMNS = (
+    "image_url",
+    "style_url",
+    "season",
+    "gender",
+    "total_cost",
+    "shipping_cost",
+    "sizes",
+)
+
+
+def parse_import_row(row):
+    """Validate one import CSV row.
+
+    Sizes are written as "size:quantity" pairs separated by ";", e.g.
+    "2T:3;3T:5". Returns (product mapping, sizes dict) or raises ValueError.
+    """
+    season = (row.get("season") or "").strip()
+    gender = (row.get("gender") or "").strip()
+    if season not in PRODUCT_SEASONS:
+        raise ValueError(f"Unknown season '{season}'.")
+    if gender not in PRODUCT_GENDERS:
+        raise ValueError(f"Unknown gender '{gender}'.")
+
+    try:
+        total_cost_usd = float(row["total_cost"])
+        shipping_cost_usd = float(row["shipping_cost"])
+    except (TypeError, ValueError):
+        raise ValueError("total_cost and shipping_cost must be numbers.")
+    if total_cost_usd < 0 or shipping_cost_usd < 0:
+        raise ValueError("Costs cannot be negative.")
+
+    sizes = {}
+    for pair in (row.get("sizes") or "").split(";"):
+        if not pair.strip():
+            continue
+        size, _, qty = pair.rpartition(":")
+        try:
+            quantity = int(qty.strip())
+        except ValueError:
+            raise ValueError(f"Invalid size entry '{pair.strip()}'.")
+        if not size.strip() or quantity < 0:
+            raise ValueError(f"Invalid size entry '{pair.strip()}'.")
+        sizes[size.strip()] = quantity
+
+    total_units = sum(sizes.values())
+    if total_units == 0:
+        raise ValueError("Total quantity must be greater than 0.")
+
+    total_cost, shipping_cost, unit_cost, selling_price = calculate_pricing(
+        total_cost_usd, shipping_cost_usd, total_units
+    )
+    product = {
+        "image_url": (row.get("image_url") or "").strip(),
+        "style_url": (row.get("style_url") or "").strip(),
+        "total_cost": total_cost,
+        "shipping_cost": shipping_cost,
+        "unit_cost": unit_cost,
+        "selling_price": selling_price,
+        "season": season,
+        "gender": gender,
+    }
+    return product, sizes
+
+
+def insert_product_batch(batch):
+    """Insert a batch of parsed rows with two executemany statements"""
+    products = [product for product, _ in batch]
+    # return_defaults fills in each mapping's new "id"
+    db.session.bulk_insert_mappings(Product, products, return_defaults=True)
+    db.session.bulk_insert_mappings(
+        SizeQuantity,
+        [
+            {"product_id": product["id"], "size": size, "quantity": quantity}
+            for product, sizes in batch
+            for size, quantity in sizes.items()
+        ],
+    )
+    refresh_search_documents(product["id"] for product in products)
+    refresh_stock_totals(product["id"] for product in products)
+    bump_product_versions(product["id"] for product in products)
+    db.session.commit()
+    query_cache.invalidate()
+    return len(batch)
+
+
+def import_products(csv_lines):
+    """Import products from CSV text, streaming rows in batches.
+
+    Returns (number of products imported, list of (line number, error)).
+    Invalid rows are skipped and reported; valid rows are still imported.
+    """
+    reader = csv.DictReader(csv_lines)
+    missing = [
+        column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or [])
+    ]
+    if missing:
+        return 0, [(1, f"Missing columns: {', '.join(missing)}")]
+
+    imported = 0
+    errors = []
+    batch = []
+    for row in reader:
+        try:
+            batch.append(parse_import_row(row))
+        except ValueError as e:
+            errors.append((reader.line_num, str(e)))
+            continue
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += insert_product_batch(batch)
+            batch = []
+
+    if batch:
+        imported += insert_product_batch(batch)
+
+    return imported, errors
+
+
+@app.cli.command("import-products")
+@click.argument("csv_path", type=click.Path(exists=True, dir_okay=False))
+def import_products_command(csv_path):
+    """Bulk import products and sizes from a CSV file"""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        imported, errors = import_products(f)
+
+    for line_num, message in errors:
+        print(f"Line {line_num}: {message}")
+    print(f"Imported {imported} product(s), {len(errors)} row(s) skipped.")
+
+
+class ProductSearchDocument(db.Model):
+    """Denormalized per-product text searched by /search.
+
+    SQLite indexes it with an FTS5 table kept in sync by triggers, Postgres
+    with a GIN index on a weighted tsvector of the same columns.
+    """
+
+    __tablename__ = "product_search_document"
+
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    product_ref = db.Column(db.String(20), nullable=False)  # Product id as text
+    season = db.Column(db.String(50))
+    gender = db.Column(db.String(50))
+    sizes = db.Column(db.Text)  # Every size of the product, space separated
+
+
+# Weighted so a search can be limited to one field: A sizes, B season,
+# C gender, D product id. The GIN index is built on this exact expression.
+# Runs of non-word characters become spaces first, splitting words the way
+# the query terms and SQLite's tokenizer do: Postgres' parser would keep
+# "Spring/Autumn" as one file-path token and split "2-3Y" into "2", "-3", "y".
+POSTGRES_SEARCH_VECTOR = (
+    r"(setweight(to_tsvector('simple',"
+    r" regexp_replace(coalesce(sizes, ''), '\W+', ' ', 'g')), 'A')"
+    r" || setweight(to_tsvector('simple',"
+    r" regexp_replace(coalesce(season, ''), '\W+', ' ', 'g')), 'B')"
+    r" || setweight(to_tsvector('simple',"
+    r" regexp_replace(coalesce(gender, ''), '\W+', ' ', 'g')), 'C')"
+    r" || setweight(to_tsvector('simple', product_ref), 'D'))"
+)
+
+SEARCH_INDEX_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE product_search_fts USING fts5("
+        "season, gender, sizes, product_ref, "
+        "content='product_search_document', content_rowid='product_id')",
+        "CREATE TRIGGER product_search_document_ai AFTER INSERT ON "
+        "product_search_document BEGIN "
+        "INSERT INTO product_search_fts(rowid, season, gender, sizes, product_ref) "
+        "VALUES (new.product_id, new.season, new.gender, new.sizes, new.product_ref); "
+        "END",
+        "CREATE TRIGGER product_search_document_ad AFTER DELETE ON "
+        "product_search_document BEGIN "
+        "INSERT INTO product_search_fts"
+        "(product_search_fts, rowid, season, gender, sizes, product_ref) "
+        "VALUES ('delete', old.product_id, old.season, old.gender, old.sizes, "
+        "old.product_ref); "
+        "END",
+        "CREATE TRIGGER product_search_document_au AFTER UPDATE ON "
+        "product_search_document BEGIN "
+        "INSERT INTO product_search_fts"
+        "(product_search_fts, rowid, season, gender, sizes, product_ref) "
+        "VALUES ('delete', old.product_id, old.season, old.gender, old.sizes, "
+        "old.product_ref); "
+        "INSERT INTO product_search_fts(rowid, season, gender, sizes, product_ref) "
+        "VALUES (new.product_id, new.season, new.gender, new.sizes, new.product_ref); "
+        "END",
+    ],
+    "postgresql": [
+        "CREATE INDEX ix_product_search_document_vector ON product_search_document "
+        f"USING gin ({POSTGRES_SEARCH_VECTOR})",
+    ],
+}
+
+for dialect_name, statements in SEARCH_INDEX_DDL.items():
+    for statement in statements:
+        event.listen(
+            ProductSearchDocument.__table__,
+            "after_create",
+            DDL(statement).execute_if(dialect=dialect_name),
+        )
+event.listen(
+    ProductSearchDocument.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS product_search_fts").execute_if(dialect="sqlite"),
+)
+
+# Maximum number of products returned by a text search
+SEARCH_RESULT_LIMIT = 50
+
+# Search type -> FTS5 columns / tsvector weights it is limited to
+SEARCH_FIELDS = {
+    "all": ("{sizes season gender}", "ABC"),
+    "size": ("sizes", "A"),
+    "season": ("season", "B"),
+    "gender": ("gender", "C"),
+}
+
+
+def refresh_search_documents(product_ids):
+    """Rebuild the search documents of the given products.
+
+    Call after adding, editing or importing products (before committing).
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    ProductSearchDocument.query.filter(
+        ProductSearchDocument.product_id.in_(product_ids)
+    ).delete(synchronize_session=False)
+
+    products = (
+        Product.query.options(selectinload(Product.sizes))
+        .filter(Product.id.in_(product_ids))
+        .all()
+    )
+    db.session.bulk_insert_mappings(
+        ProductSearchDocument,
+        [
+            {
+                "product_id": product.id,
+                "product_ref": str(product.id),
+                "season": product.season,
+                "gender": product.gender,
+                "sizes": " ".join(sq.size for sq in product.sizes if sq.size),
+            }
+            for product in products
+        ],
+    )
+
+
+def search_product_ids(search_query, search_type, limit=SEARCH_RESULT_LIMIT):
+    """Return ids of in-stock products matching a text search, best first.
+
+    Every word of the query must match the start of a word in the searched
+    fields. An "all" search for a number also matches that product id.
+    """
+    terms = re.findall(r"\w+", search_query.lower())
+    if not terms or search_type not in SEARCH_FIELDS:
+        return []
+
+    columns, weights = SEARCH_FIELDS[search_type]
+    match_product_id = search_type == "all" and search_query.isdigit()
+    in_stock = (
+        "EXISTS (SELECT 1 FROM size_quantity"
+        " WHERE size_quantity.product_id = {id} AND size_quantity.quantity > 0)"
+    )
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        tsquery = " & ".join(f"{term}:*{weights}" for term in terms)
+        if match_product_id:
+            tsquery = f"({tsquery}) | {search_query}:D"
+        sql = (
+            "SELECT product_id FROM product_search_document"
+            f" WHERE {POSTGRES_SEARCH_VECTOR} @@ to_tsquery('simple', :query)"
+            f" AND {in_stock.format(id='product_search_document.product_id')}"
+            f" ORDER BY ts_rank({POSTGRES_SEARCH_VECTOR},"
+            " to_tsquery('simple', :query)) DESC, product_id DESC"
+            " LIMIT :limit"
+        )
+        params = {"query": tsquery, "limit": limit}
+    else:
+        match = " ".join(f'"{term}"*' for term in terms)
+        match = f"{columns} : ({match})"
+        if match_product_id:
+            match = f'{match} OR product_ref : "{search_query}"'
+        sql = (
+            "SELECT rowid FROM product_search_fts"
+            " WHERE product_search_fts MATCH :query"
+            f" AND {in_stock.format(id='product_search_fts.rowid')}"
+            " ORDER BY rank, rowid DESC LIMIT :limit"
+        )
+        params = {"query": match, "limit": limit}
+
+    return [row[0] for row in db.session.execute(db.text(sql), params)]
+
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index():
+    """Rebuild every product's search document"""
+    ProductSearchDocument.query.delete()
+    product_ids = [product_id for (product_id,) in db.session.query(Product.id)]
+    for start in range(0, len(product_ids), IMPORT_BATCH_SIZE):
+        refresh_search_documents(product_ids[start : start + IMPORT_BATCH_SIZE])
+    db.session.commit()
+    print(f"Search index rebuilt for {len(product_ids)} product(s).")
+
+
 # Initialize database tables
 def init_db():
     """Initialize database tables"""
@@ -166,8 +1038,439 @@ def admin_required(f):
     return decorated_function
 
 
+class QueryCache:
+    """Small in-process cache with TTL expiry and LRU eviction.
+
+    Invalidation is generation based: invalidate() bumps a generation
+    counter and entries stored under an older generation count as misses.
+    With a shared_path the counter lives in a SQLite file, so an
+    invalidation in one worker process is seen by all of them.
+    """
+
+    def __init__(self, ttl, max_entries, shared_path=None, name="query"):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared_path = shared_path
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._shared_ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.shared_path, timeout=5, isolation_level=None)
+        if not self._shared_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_generation "
+                "(id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO cache_generation VALUES (1, 0)")
+            self._shared_ready = True
+        return conn
+
+    def generation(self):
+        if not self.shared_path:
+            return self._generation
+
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT value FROM cache_generation WHERE id = 1"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        generation = self.generation()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == generation and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                return entry[2]
+            self.misses += 1
+        CACHE_LOOKUPS.labels(self.name, "miss").inc()
+
+        value = compute()
+
+        with self._lock:
+            # Stored under the generation read before computing, so a write
+            # that lands meanwhile still invalidates this entry
+            self._entries[key] = (generation, now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def invalidate(self):
+        """Drop every cached entry; call after committing a write"""
+        if self.shared_path:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "UPDATE cache_generation SET value = value + 1 WHERE id = 1"
+                )
+            finally:
+                conn.close()
+
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "pid": os.getpid(),
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "shared_path": self.shared_path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+
+query_cache = QueryCache(
+    ttl=app.config["CACHE_TTL_SECONDS"],
+    max_entries=app.config["CACHE_MAX_ENTRIES"],
+    shared_path=app.config["CACHE_SHARED_PATH"],
+)
+
+# Session users for load_user. Kept per process on purpose (no shared
+# generation file to read on every request), so the TTL bounds how long
+# another worker can serve a user changed or deleted elsewhere.
+user_cache = QueryCache(
+    ttl=app.config["USER_CACHE_TTL_SECONDS"],
+    max_entries=app.config["USER_CACHE_MAX_ENTRIES"],
+    name="user",
+)
+
+
+class RequestProfiler:
+    """Rolling per-endpoint timings of the most recent requests"""
+
+    def __init__(self, window):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, sample):
+        with self._lock:
+            self._samples[endpoint].append(sample)
+
+    def summary(self):
+        """Aggregates per endpoint, the most total time spent first"""
+        with self._lock:
+            samples = {endpoint: list(s) for endpoint, s in self._samples.items()}
+
+        rows = []
+        for endpoint, items in samples.items():
+            totals = sorted(item["total_ms"] for item in items)
+            count = len(items)
+            rows.append(
+                {
+                    "endpoint": endpoint,
+                    "requests": count,
+                    "mean_ms": sum(totals) / count,
+                    "p95_ms": totals[min(count - 1, int(count * 0.95))],
+                    "max_ms": totals[-1],
+                    "mean_queries": sum(item["queries"] for item in items) / count,
+                    "mean_db_ms": sum(item["db_ms"] for item in items) / count,
+                    "mean_render_ms": sum(item["render_ms"] for item in items) / count,
+                    "slow_requests": sum(1 for item in items if item["slow"]),
+                }
+            )
+        return sorted(
+            rows, key=lambda row: row["mean_ms"] * row["requests"], reverse=True
+        )
+
+
+request_profiler = RequestProfiler(app.config["PROFILE_WINDOW"])
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        endpoint = request.endpoint or "unknown"
+        method = request.method
+
+        def observe():
+            REQUEST_LATENCY.labels(endpoint, method).observe(
+                time.perf_counter() - started
+            )
+            REQUESTS.labels(endpoint, method, response.status_code).inc()
+
+        # Observed on close so streamed responses include their streaming time
+        response.call_on_close(observe)
+    return response
+
+
+@app.before_request
+def start_request_profile():
+    if app.config["PROFILE_REQUESTS"]:
+        g.profile = {"start": time.perf_counter(), "queries": [], "render_ms": 0.0}
+
+
+@app.after_request
+def finish_request_profile(response):
+    profile = g.get("profile")
+    if profile is not None:
+        endpoint = request.endpoint or "unknown"
+        path = request.path
+        # Recorded on close so streamed responses include their streaming time
+        response.call_on_close(lambda: record_request_profile(endpoint, path, profile))
+    return response
+
+
+def record_request_profile(endpoint, path, profile):
+    total_ms = (time.perf_counter() - profile["start"]) * 1000
+    queries = profile["queries"]
+    sample = {
+        "total_ms": total_ms,
+        "queries": len(queries),
+        "db_ms": sum(duration for duration, _ in queries),
+        "render_ms": profile["render_ms"],
+        "slow": total_ms >= app.config["SLOW_REQUEST_MS"],
+    }
+    request_profiler.record(endpoint, sample)
+
+    if sample["slow"]:
+        slowest = sorted(queries, key=lambda query: query[0], reverse=True)[:3]
+        app.logger.warning(
+            "Slow request %s (%s): %.0f ms total, %d queries in %.0f ms, "
+            "render %.0f ms. Slowest statements: %s",
+            path,
+            endpoint,
+            total_ms,
+            sample["queries"],
+            sample["db_ms"],
+            sample["render_ms"],
+            " | ".join(
+                f"{duration:.1f} ms: {' '.join(statement.split())[:200]}"
+                for duration, statement in slowest
+            ),
+        )
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    duration = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    if has_request_context():
+        profile = g.get("profile")
+        if profile is not None:
+            profile["queries"].append((duration, statement))
+
+
+def start_render_timer(sender, template, context, **extra):
+    profile = g.get("profile")
+    if profile is not None:
+        profile["render_start"] = time.perf_counter()
+
+
+def stop_render_timer(sender, template, context, **extra):
+    profile = g.get("profile")
+    if profile is not None and "render_start" in profile:
+        # Includes any lazy loads the template triggers
+        profile["render_ms"] += (
+            time.perf_counter() - profile.pop("render_start")
+        ) * 1000
+
+
+if app.config["PROFILE_REQUESTS"]:
+    # Only hooked in when enabled, so normal requests pay nothing
+    event.listen(Engine, "before_cursor_execute", start_query_timer)
+    event.listen(Engine, "after_cursor_execute", stop_query_timer)
+    before_render_template.connect(start_render_timer, app)
+    template_rendered.connect(stop_render_timer, app)
+
+
+# Rows fetched per round trip (and written per chunk) by the CSV exports
+CSV_STREAM_BATCH_SIZE = 1000
+
+
+def stream_csv(header, rows):
+    """Yield CSV text chunk by chunk so exports never hold the whole file"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    # Send the header straight away so the download starts immediately
+    writer.writerow(header)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % CSV_STREAM_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+    buffer.close()
+
+
+# Rendered product cards. Keys include the product version, which every
+# edit, sell and revert bumps, so a stale card is never served; entries
+# only need to age out of the LRU.
+fragment_cache = QueryCache(
+    ttl=24 * 3600,
+    max_entries=app.config["FRAGMENT_CACHE_MAX_ENTRIES"],
+    name="fragment",
+)
+
+
+@app.template_global()
+def cached_product_card(template_name, product, **context):
+    """Render a product card partial, reusing it while the product is unchanged"""
+    key = (template_name, product.id, product.version, tuple(sorted(context.items())))
+    return Markup(
+        fragment_cache.get_or_compute(
+            key,
+            lambda: app.jinja_env.get_template(template_name).render(
+                product=product, **context
+            ),
+        )
+    )
+
+
+def build_id():
+    """Deploy's git commit, else a hash of the templates and view code.
+
+    Stable across restarts and across the workers of one deploy, so a
+    restart alone doesn't invalidate every cached page.
+    """
+    if os.environ.get("RENDER_GIT_COMMIT"):
+        return os.environ["RENDER_GIT_COMMIT"]
+    digest = hashlib.sha1()
+    paths = [os.path.join(app.root_path, "app.py")]
+    for directory, _, file_names in sorted(
+        os.walk(os.path.join(app.root_path, app.template_folder))
+    ):
+        paths.extend(os.path.join(directory, name) for name in sorted(file_names))
+    for path in paths:
+        digest.update(os.path.relpath(path, app.root_path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Part of the catalog page ETags so a deploy with changed templates never
+# answers 304 for a page rendered by the old ones
+APP_BUILD = build_id()
+
+
+def conditional_on_catalog(view):
+    """Answer a GET with 304 Not Modified while the catalog is unchanged.
+
+    The ETag covers the catalog version, the user, the full URL and the
+    build, which together determine the rendered page. Pages carrying a
+    flash message are always rendered.
+    """
+
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if (
+            request.method != "GET"
+            or not current_user.is_authenticated
+            or session.get("_flashes")
+        ):
+            return view(*args, **kwargs)
+
+        catalog = db.session.get(CatalogVersion, 1)
+        etag = hashlib.sha1(
+            f"{catalog.value}:{current_user.id}:{current_user.role}:"
+            f"{request.full_path}:{APP_BUILD}".encode()
+        ).hexdigest()
+
+        def add_validators(response):
+            # No Last-Modified: the catalog's updated_at says nothing about
+            # the user or the build, so a client revalidating with
+            # If-Modified-Since alone could get a 304 for a stale page
+            response.set_etag(etag)
+            # Tablets may keep the page but must check back before reusing it
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        response = add_validators(Response()).make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            add_validators(response)
+        return response
+
+    return decorated_function
+
+
+# Inventory listing page size (keyset pagination on Product.id DESC)
+INDEX_PAGE_SIZE = 48
+INDEX_MAX_PAGE_SIZE = 200
+
+
+def apply_product_filters(query, season_filter, gender_filter):
+    """Apply the season/gender filters used by the inventory listing"""
+    if season_filter != "All":
+        query = query.filter(Product.season == season_filter)
+
+    if gender_filter != "All":
+        query = query.filter(Product.gender == gender_filter)
+
+    return query
+
+
+# Rows per page on the recent sales and revert history listings
+HISTORY_PAGE_SIZE = 50
+
+
+def apply_history_cursor(query, timestamp_column, id_column, before_id):
+    """Keyset-paginate a listing ordered by (timestamp DESC, id DESC).
+
+    before_id is the id of the last row on the previous page; its
+    timestamp is looked up in SQL so the comparison is against the stored
+    value rather than a re-parsed one.
+    """
+    if before_id is None:
+        return query
+
+    cursor_timestamp = (
+        db.select(timestamp_column).where(id_column == before_id).scalar_subquery()
+    )
+    return query.filter(
+        db.or_(
+            timestamp_column < cursor_timestamp,
+            db.and_(timestamp_column == cursor_timestamp, id_column < before_id),
+        )
+    )
+
+
 # Routes
 @app.route("/")
+@conditional_on_catalog
 def index():
     # If user is not logged in, redirect to login
     if not current_user.is_authenticated:
@@ -177,35 +1480,64 @@ def index():
     season_filter = request.args.get("season", "All")
     gender_filter = request.args.get("gender", "All")
 
-    # Build query based on filters
-    query = Product.query
-
-    if season_filter != "All":
-        query = query.filter(Product.season == season_filter)
-
-    if gender_filter != "All":
-        query = query.filter(Product.gender == gender_filter)
-
-    # ORDER BY id DESC to show newest products first
-    products = query.order_by(Product.id.desc()).all()
+    # Pagination parameters: "before" is the last product id of the previous
+    # page, so each page is a bounded index range scan instead of an OFFSET
+    per_page = request.args.get("per_page", INDEX_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, INDEX_MAX_PAGE_SIZE))
+    before_id = request.args.get("before", type=int)
 
-    low_stock_threshold = 1
+    # Build query based on filters
+    query = apply_product_filters(Product.query, season_filter, gender_filter)
+
+    if before_id is not None:
+        query = query.filter(Product.id < before_id)
+
+    # ORDER BY id DESC to show newest products first.
+    # selectinload fetches every product's sizes in one extra query instead
+    # of one query per product when the template walks them.
+    # Fetch one extra row to know whether there is a next page.
+    products = (
+        query.options(selectinload(Product.sizes))
+        .order_by(Product.id.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+    has_more = len(products) > per_page
+    products = products[:per_page]
+    next_before = products[-1].id if has_more else None
 
-    # Collect low stock items: list of dicts {product, size, quantity}
-    low_stock_items = []
-    for product in products:
-        for sq in product.sizes:
-            if sq.quantity <= low_stock_threshold:
-                low_stock_items.append(
-                    {"product": product, "size": sq.size, "quantity": sq.quantity}
-                )
+    if request.args.get("format") == "json":
+        return jsonify(
+            {
+                "products": [
+                    {
+                        "id": product.id,
+                        "image_url": product.image_url,
+                        "style_url": product.style_url,
+                        "selling_price": product.selling_price,
+                        "season": product.season,
+                        "gender": product.gender,
+                        "total_units": product.total_units,
+                        "sizes": [
+                            {"size": sq.size, "quantity": sq.quantity}
+                            for sq in product.sizes
+                        ],
+                    }
+                    for product in products
+                ],
+                "per_page": per_page,
+                "next_before": next_before,
+            }
+        )
 
     return render_template(
         "index.html",
         products=products,
-        low_stock_items=low_stock_items,
         season_filter=season_filter,
         gender_filter=gender_filter,
+        per_page=per_page,
+        before_id=before_id,
+        next_before=next_before,
     )
 
 
@@ -266,6 +1598,7 @@ def delete_user(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    user_cache.invalidate()
     flash(f"User '{user.username}' deleted successfully!", "success")
     return redirect(url_for("manage_users"))
 
@@ -294,10 +1627,9 @@ def change_password():
             return redirect(url_for("change_password"))
 
         # Update password
-        current_user.password_hash = bcrypt.generate_password_hash(new_password).decode(
-            "utf-8"
-        )
+        current_user.set_password(new_password)
         db.session.commit()
+        user_cache.invalidate()
 
         flash("Password changed successfully!", "success")
         return redirect(url_for("index"))
@@ -330,14 +1662,11 @@ def add_product():
         if total_units == 0:
             flash("Total quantity must be greater than 0.", "danger")
             return redirect(url_for("add_product"))
-        total_cost = total_cost * 1400  # Convert to IQD
-        shipping_cost = shipping_cost * 1400  # Convert to IQD
-
-        unit_cost = (total_cost + shipping_cost) / total_units
 
-        selling_price = int(
-            round((unit_cost + 7000) / 1000) * 1000
-        )  # Round to nearest 1000 IQD
+        # Convert to IQD and price the product
+        total_cost, shipping_cost, unit_cost, selling_price = calculate_pricing(
+            total_cost, shipping_cost, total_units
+        )
 
         # Save product to DB with new categories
         product = Product(
@@ -356,31 +1685,65 @@ def add_product():
         for size, qty in sizes.items():
             db.session.add(SizeQuantity(size=size, quantity=qty, product_id=product.id))
 
+        refresh_search_documents([product.id])
+        refresh_stock_totals([product.id])
+        bump_product_versions([product.id])
         db.session.commit()
+        query_cache.invalidate()
         flash("Product added successfully!", "success")
         return redirect(url_for("index"))
 
     return render_template("add_product.html")
 
 
+@app.route("/import-products", methods=["GET", "POST"])
+@login_required
+@admin_required
+def import_products_view():
+    imported = None
+    errors = []
+
+    if request.method == "POST":
+        csv_file = request.files.get("csv_file")
+        if not csv_file or not csv_file.filename:
+            flash("Please choose a CSV file to import.", "danger")
+            return redirect(url_for("import_products_view"))
+
+        # Read the upload as a text stream rather than loading it whole
+        imported, errors = import_products(
+            TextIOWrapper(csv_file.stream, encoding="utf-8-sig", newline="")
+        )
+        flash(
+            f"Imported {imported} product(s), {len(errors)} row(s) skipped.",
+            "success" if imported else "warning",
+        )
+
+    return render_template(
+        "import_products.html",
+        imported=imported,
+        errors=errors,
+        columns=IMPORT_COLUMNS,
+    )
+
+
 @app.route("/sell", methods=["GET", "POST"])
 @login_required
+@conditional_on_catalog
 def sell_product():
     if request.method == "POST":
         product_id = int(request.form["product_id"])
         size = request.form["size"]
         quantity = int(request.form["quantity"])
 
-        # Get the product and size entry
         product = Product.query.get_or_404(product_id)
-        size_entry = SizeQuantity.query.filter_by(
-            product_id=product_id, size=size
-        ).first()
 
-        if size_entry and size_entry.quantity >= quantity:
-            # Update inventory
-            size_entry.quantity -= quantity
+        if quantity < 1:
+            flash("Quantity must be at least 1.", "danger")
+            return redirect(url_for("sell_product"))
 
+        # Check and update inventory in one statement so concurrent sells
+        # of the last unit cannot both succeed
+        if decrement_stock(product_id, size, quantity):
             # Record the sale
             sale = Sale(
                 product_id=product_id,
@@ -390,17 +1753,224 @@ def sell_product():
                 unit_cost=product.unit_cost,
             )
             db.session.add(sale)
+            db.session.flush()  # Assigns the timestamp used by the rollup
+            update_sales_rollup(sale)
+            refresh_stock_totals([product_id])
+            bump_product_versions([product_id])
             db.session.commit()
+            query_cache.invalidate()
+            SALES_RECORDED.inc()
+            UNITS_SOLD.inc(quantity)
 
             flash(f"Sold {quantity} unit(s) of size {size}.", "success")
         else:
+            STOCK_OUTS.inc()
             flash(f"Not enough stock for size '{size}'!", "danger")
 
         return redirect(url_for("sell_product"))
 
-    # Load all products and their sizes
-    products = Product.query.all()
-    return render_template("sell.html", products=products)
+    # Read before the products, so the page's inventory sync starting from
+    # this version re-fetches (never misses) changes made in between
+    catalog_version = db.session.get(CatalogVersion, 1).value
+
+    # Load all products and their sizes (sizes in a single batched query)
+    products = Product.query.options(selectinload(Product.sizes)).all()
+    return render_template(
+        "sell.html", products=products, catalog_version=catalog_version
+    )
+
+
+# Maximum number of line items accepted by a single checkout
+CHECKOUT_MAX_LINES = 100
+
+
+@app.route("/sell/checkout", methods=["POST"])
+@login_required
+def checkout():
+    """Sell every line of a cart in one transaction.
+
+    Expects JSON {"items": [{"product_id", "size", "quantity"}, ...]}.
+    Either every line is sold or none is; the response lists a result
+    per line.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object with an items list."}), 400
+    items = data.get("items") or []
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "The cart is empty."}), 400
+    if len(items) > CHECKOUT_MAX_LINES:
+        return (
+            jsonify({"error": f"A cart can hold at most {CHECKOUT_MAX_LINES} lines."}),
+            400,
+        )
+
+    lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            return (
+                jsonify({"error": "Each line needs a product_id, size and quantity."}),
+                400,
+            )
+        try:
+            lines.append(
+                {
+                    "product_id": int(item["product_id"]),
+                    "size": str(item["size"]).strip(),
+                    "quantity": int(item["quantity"]),
+                }
+            )
+        except (KeyError, TypeError, ValueError):
+            return (
+                jsonify({"error": "Each line needs a product_id, size and quantity."}),
+                400,
+            )
+
+    # Load every product and size in the cart with a single query
+    product_ids = {line["product_id"] for line in lines}
+    rows = (
+        db.session.query(Product, SizeQuantity)
+        .outerjoin(SizeQuantity)
+        .filter(Product.id.in_(product_ids))
+        .all()
+    )
+    products = {product.id: product for product, _ in rows}
+    stock = defaultdict(int)
+    for _, size_entry in rows:
+        if size_entry is not None:
+            stock[(size_entry.product_id, size_entry.size)] += size_entry.quantity
+
+    # Validate every line against stock, counting repeated product/size lines
+    requested = defaultdict(int)
+    for line in lines:
+        requested[(line["product_id"], line["size"])] += line["quantity"]
+
+    valid = True
+    for line in lines:
+        key = (line["product_id"], line["size"])
+        if line["product_id"] not in products:
+            line.update(status="error", message="Product not found.")
+        elif line["quantity"] < 1:
+            line.update(status="error", message="Quantity must be at least 1.")
+        elif requested[key] > stock[key]:
+            line.update(
+                status="error",
+                message=f"Not enough stock for size '{line['size']}'!",
+            )
+            STOCK_OUTS.inc()
+        else:
+            line.update(status="ok")
+            continue
+        valid = False
+
+    if not valid:
+        return jsonify({"success": False, "lines": lines}), 409
+
+    # Decrement stock once per product/size; the conditional UPDATE still
+    # guards against a concurrent sell taking the stock since validation.
+    # Sorted, so concurrent checkouts lock the size rows in the same order
+    # instead of deadlocking on carts listed in opposite orders.
+    for (product_id, size), quantity in sorted(requested.items()):
+        if not decrement_stock(product_id, size, quantity):
+            db.session.rollback()
+            STOCK_OUTS.inc()
+            for line in lines:
+                if (line["product_id"], line["size"]) == (product_id, size):
+                    line.update(
+                        status="error",
+                        message=f"Not enough stock for size '{size}'!",
+                    )
+            return jsonify({"success": False, "lines": lines}), 409
+
+    sales = [
+        Sale(
+            product_id=line["product_id"],
+            size=line["size"],
+            quantity=line["quantity"],
+            selling_price=products[line["product_id"]].selling_price,
+            unit_cost=products[line["product_id"]].unit_cost,
+        )
+        for line in lines
+    ]
+    db.session.add_all(sales)
+    db.session.flush()  # Assigns ids and timestamps used by the rollup
+
+    for line, sale in zip(lines, sales):
+        update_sales_rollup(sale)
+        line.update(status="sold", sale_id=sale.id)
+
+    refresh_stock_totals(product_ids)
+    bump_product_versions(product_ids)
+    db.session.commit()
+    query_cache.invalidate()
+    SALES_RECORDED.inc(len(sales))
+    UNITS_SOLD.inc(sum(sale.quantity for sale in sales))
+
+    return jsonify({"success": True, "lines": lines})
+
+
+# Column order of the product rows returned by the inventory API
+INVENTORY_FIELDS = [
+    "id",
+    "version",
+    "selling_price",
+    "season",
+    "gender",
+    "image_url",
+    "sizes",
+    "quantities",
+]
+
+
+@app.route("/api/inventory")
+@login_required
+def inventory_api():
+    """Products with their stock as compact rows, for the sell screen.
+
+    Each product is an array in INVENTORY_FIELDS order, its sizes and
+    quantities parallel arrays. With ?since=<version> only products changed
+    after that catalog version are returned, plus the ids deleted since;
+    "full" tells the client whether to drop what it already has.
+    """
+    since = request.args.get("since", type=int)
+    catalog_version = db.session.get(CatalogVersion, 1).value
+    if since is not None and since > catalog_version:
+        since = None  # The client synced against another database; start over
+
+    products = []
+    deleted = []
+    if since != catalog_version:
+        query = Product.query.options(selectinload(Product.sizes))
+        if since is not None:
+            query = query.filter(Product.version > since)
+            deleted = [
+                row.product_id
+                for row in DeletedProduct.query.filter(DeletedProduct.version > since)
+            ]
+        products = [
+            [
+                product.id,
+                product.version,
+                product.selling_price,
+                product.season,
+                product.gender,
+                product.image_url,
+                [sq.size for sq in product.sizes],
+                [sq.quantity for sq in product.sizes],
+            ]
+            for product in query.order_by(Product.id)
+        ]
+
+    return jsonify(
+        {
+            "version": catalog_version,
+            "full": since is None,
+            "fields": INVENTORY_FIELDS,
+            "products": products,
+            "deleted": deleted,
+        }
+    )
 
 
 # Replace the existing search route in app.py with this enhanced version
@@ -417,39 +1987,41 @@ def search():
         search_type = request.form.get("search_type", "all")
 
         if search_query:
-            # Base query joining Product and SizeQuantity
-            base_query = db.session.query(Product, SizeQuantity).join(SizeQuantity)
-
-            if search_type == "size":
-                # Search by size only
-                results = base_query.filter(
-                    SizeQuantity.size.ilike(f"%{search_query}%"),
-                    SizeQuantity.quantity > 0,
-                ).all()
-
-            elif search_type == "season":
-                # Search by season
-                results = base_query.filter(
-                    Product.season.ilike(f"%{search_query}%"), SizeQuantity.quantity > 0
-                ).all()
-
-            elif search_type == "gender":
-                # Search by gender
-                results = base_query.filter(
-                    Product.gender.ilike(f"%{search_query}%"), SizeQuantity.quantity > 0
-                ).all()
-
-            elif search_type == "price":
+            # Base query joining Product and its in-stock sizes; the template
+            # also lists every size of each product, so load those up front
+            base_query = (
+                db.session.query(Product, SizeQuantity)
+                .join(SizeQuantity)
+                .filter(SizeQuantity.quantity > 0)
+                .options(selectinload(Product.sizes))
+            )
+
+            if search_type == "price":
                 # Search by price range (assuming user enters a number)
                 try:
                     price_value = float(search_query)
-                    # Search for products within ±5000 IQD of the entered price
-                    results = base_query.filter(
-                        Product.selling_price.between(
-                            price_value - 5000, price_value + 5000
-                        ),
-                        SizeQuantity.quantity > 0,
-                    ).all()
+                    # Search for products within ±5000 IQD of the entered price,
+                    # closest prices first, limited like the text search
+                    product_ids = [
+                        product_id
+                        for (product_id,) in db.session.query(Product.id)
+                        .filter(
+                            Product.selling_price.between(
+                                price_value - 5000, price_value + 5000
+                            ),
+                            Product.sizes.any(SizeQuantity.quantity > 0),
+                        )
+                        .order_by(
+                            func.abs(Product.selling_price - price_value),
+                            Product.id.desc(),
+                        )
+                        .limit(SEARCH_RESULT_LIMIT)
+                    ]
+                    rank = {product_id: i for i, product_id in enumerate(product_ids)}
+                    results = sorted(
+                        base_query.filter(Product.id.in_(product_ids)).all(),
+                        key=lambda row: (rank[row[0].id], row[1].id),
+                    )
                 except ValueError:
                     results = []
 
@@ -457,46 +2029,42 @@ def search():
                 # Search by product ID
                 try:
                     product_id = int(search_query)
-                    results = base_query.filter(
-                        Product.id == product_id, SizeQuantity.quantity > 0
-                    ).all()
+                    results = base_query.filter(Product.id == product_id).all()
                 except ValueError:
                     results = []
 
-            else:  # search_type == "all"
-                # Comprehensive search across multiple fields
-                results = base_query.filter(
-                    db.or_(
-                        # Search in sizes
-                        SizeQuantity.size.ilike(f"%{search_query}%"),
-                        # Search in season
-                        Product.season.ilike(f"%{search_query}%"),
-                        # Search in gender
-                        Product.gender.ilike(f"%{search_query}%"),
-                        # Search in product ID (if it's a number)
-                        (
-                            Product.id == int(search_query)
-                            if search_query.isdigit()
-                            else False
-                        ),
+            else:
+                # Text search (all fields, size, season or gender) through the
+                # full-text index, best matches first
+                product_ids = search_product_ids(search_query, search_type)
+                rows = base_query.filter(Product.id.in_(product_ids)).all()
+
+                # Show only the matching sizes when the sizes matched
+                terms = re.findall(r"\w+", search_query.lower())
+                matching_sizes = {
+                    (product.id, sq.id)
+                    for product, sq in rows
+                    if any(term in (sq.size or "").lower() for term in terms)
+                }
+                matched_by_size = {product_id for product_id, _ in matching_sizes}
+
+                rank = {product_id: i for i, product_id in enumerate(product_ids)}
+                results = sorted(
+                    (
+                        (product, sq)
+                        for product, sq in rows
+                        if (product.id, sq.id) in matching_sizes
+                        or (search_type != "size" and product.id not in matched_by_size)
                     ),
-                    SizeQuantity.quantity > 0,
-                ).all()
-
-    # Remove duplicates while preserving order
-    unique_results = []
-    seen = set()
-    for product, size in results:
-        key = (product.id, size.id)
-        if key not in seen:
-            seen.add(key)
-            unique_results.append((product, size))
+                    key=lambda row: (rank[row[0].id], row[1].id),
+                )
 
     return render_template(
         "search.html",
-        results=unique_results,
+        results=results,
         search_query=search_query,
         search_type=search_type,
+        result_limit=SEARCH_RESULT_LIMIT,
     )
 
 
@@ -507,13 +2075,6 @@ def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
 
     if request.method == "POST":
-        product.image_url = request.form["image_url"]
-        product.style_url = request.form["style_url"]
-
-        # Update categories
-        product.season = request.form["season"]
-        product.gender = request.form["gender"]
-
         # Get costs in USD (user input)
         total_cost_usd = float(request.form["total_cost"])
         shipping_cost_usd = float(request.form["shipping_cost"])
@@ -530,36 +2091,58 @@ def edit_product(product_id):
             flash("Total quantity must be greater than 0.", "danger")
             return redirect(url_for("edit_product", product_id=product_id))
 
-        # Convert USD to IQD (same as add_product)
-        total_cost_iqd = total_cost_usd * 1400
-        shipping_cost_iqd = shipping_cost_usd * 1400
-
-        # Calculate unit cost and selling price in IQD
-        unit_cost = (total_cost_iqd + shipping_cost_iqd) / total_units
-        selling_price = (
-            round((unit_cost + 7000) / 1000) * 1000
-        )  # Round to nearest 1000 IQD
-
-        # Update product with IQD values
-        product.total_cost = total_cost_iqd
-        product.shipping_cost = shipping_cost_iqd
-        product.unit_cost = unit_cost
-        product.selling_price = selling_price
-
-        # Remove old sizes
-        SizeQuantity.query.filter_by(product_id=product_id).delete()
+        # Convert USD to IQD and price the product (same as add_product)
+        total_cost_iqd, shipping_cost_iqd, unit_cost, selling_price = calculate_pricing(
+            total_cost_usd, shipping_cost_usd, total_units
+        )
 
-        # Add new sizes
-        for size, qty in sizes.items():
-            db.session.add(SizeQuantity(size=size, quantity=qty, product_id=product.id))
+        # Sizes first, like a sell, which locks the size row before the
+        # product row: the opposite order could deadlock against one
+        update_product_sizes(product.id, sizes)
+
+        # Update product with IQD values, but only if it is still at the
+        # version the form was loaded at: a sale or another edit since then
+        # would otherwise be overwritten with the stock shown in the form.
+        # The rollback also undoes the size changes.
+        updated = db.session.execute(
+            db.update(Product)
+            .where(
+                Product.id == product_id,
+                Product.version == request.form.get("version", type=int),
+            )
+            .values(
+                image_url=request.form["image_url"],
+                style_url=request.form["style_url"],
+                season=request.form["season"],
+                gender=request.form["gender"],
+                total_cost=total_cost_iqd,
+                shipping_cost=shipping_cost_iqd,
+                unit_cost=unit_cost,
+                selling_price=selling_price,
+            )
+        ).rowcount
+        if not updated:
+            db.session.rollback()
+            flash(
+                "This product changed while you were editing it (a sale or "
+                "another edit). Check the current stock and save again.",
+                "warning",
+            )
+            return redirect(url_for("edit_product", product_id=product_id))
 
+        refresh_search_documents([product.id])
+        refresh_stock_totals([product.id])
+        bump_product_versions([product.id])
         db.session.commit()
+        query_cache.invalidate()
         flash("Product updated successfully!", "success")
         return redirect(url_for("index"))
 
     # GET: Convert IQD back to USD for form display
-    total_cost_usd = product.total_cost / 1400 if product.total_cost else 0
-    shipping_cost_usd = product.shipping_cost / 1400 if product.shipping_cost else 0
+    total_cost_usd = product.total_cost / USD_TO_IQD if product.total_cost else 0
+    shipping_cost_usd = (
+        product.shipping_cost / USD_TO_IQD if product.shipping_cost else 0
+    )
 
     sizes = product.sizes
     return render_template(
@@ -576,63 +2159,296 @@ def edit_product(product_id):
 @admin_required
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
+    ProductSearchDocument.query.filter_by(product_id=product.id).delete()
     db.session.delete(product)
+    # merge: SQLite may hand a deleted id to a new product that is deleted too
+    db.session.merge(
+        DeletedProduct(product_id=product.id, version=bump_product_versions([]))
+    )
     db.session.commit()
+    query_cache.invalidate()
     flash("Product deleted successfully!", "success")
     return redirect(url_for("index"))
 
 
-@app.route("/export")
-@login_required
-@admin_required
-def export_sales():
-    # Get sales excluding reverted ones
+def sales_export_csv():
+    """Header and rows of the all-sales export"""
+    # Get sales excluding reverted ones. yield_per streams the rows through a
+    # server-side cursor in batches instead of loading the whole table
     sales = (
-        db.session.query(Sale)
-        .outerjoin(SaleRevert, Sale.id == SaleRevert.sale_id)
-        .filter(SaleRevert.id.is_(None))  # Only include non-reverted sales
+        db.session.query(
+            Sale.timestamp,
+            Sale.product_id,
+            Sale.size,
+            Sale.quantity,
+            Sale.selling_price,
+            Sale.unit_cost,
+        )
+        .filter(Sale.reverted_at.is_(None))  # Only include non-reverted sales
         .order_by(Sale.timestamp.desc())
-        .all()
+        .yield_per(CSV_STREAM_BATCH_SIZE)
     )
 
-    # Create CSV in memory
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(
+    header = [
+        "Date",
+        "Product ID",
+        "Size",
+        "Quantity",
+        "Selling Price",
+        "Unit Cost",
+        "Profit",
+    ]
+    rows = (
         [
-            "Date",
-            "Product ID",
-            "Size",
-            "Quantity",
-            "Selling Price",
-            "Unit Cost",
-            "Profit",
+            sale.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            sale.product_id,
+            sale.size,
+            sale.quantity,
+            sale.selling_price,
+            sale.unit_cost,
+            round(sale.selling_price - sale.unit_cost, 2),
         ]
+        for sale in sales
     )
+    return header, rows
 
-    for sale in sales:
-        writer.writerow(
-            [
-                sale.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                sale.product_id,
-                sale.size,
-                sale.quantity,
-                sale.selling_price,
-                sale.unit_cost,
-                round(sale.selling_price - sale.unit_cost, 2),
-            ]
-        )
-
-    output = si.getvalue()
-    si.close()
 
+@app.route("/export")
+@login_required
+@admin_required
+def export_sales():
     return Response(
-        output,
+        stream_with_context(stream_csv(*sales_export_csv())),
         mimetype="text/csv",
         headers={"Content-Disposition": "attachment;filename=sales_report.csv"},
     )
 
 
+SalesSummary = namedtuple(
+    "SalesSummary",
+    "total_sales total_units_sold total_revenue total_cost total_profit",
+)
+ProductPerformance = namedtuple(
+    "ProductPerformance",
+    "id image_url style_url selling_price units_sold revenue cost profit "
+    "margin sell_through",
+)
+SizePerformance = namedtuple(
+    "SizePerformance",
+    "size sales_count total_quantity total_revenue margin sell_through",
+)
+SeasonPerformance = namedtuple(
+    "SeasonPerformance", "season units_sold revenue profit margin sell_through"
+)
+DailySales = namedtuple(
+    "DailySales",
+    "sale_date sales_count units_sold revenue profit revenue_7d revenue_30d",
+)
+WeekdaySales = namedtuple(
+    "WeekdaySales", "weekday sales_count units_sold revenue profit"
+)
+# sales_count, units, revenue, cost, profit and on_hand columns
+REPORT_MEASURE_DTYPES = (
+    np.int64,
+    np.int64,
+    np.float64,
+    np.float64,
+    np.float64,
+    np.int64,
+)
+
+
+def report_sales_groups(start_date, end_date):
+    """Rollup totals per product and size and per day, in one statement.
+
+    Postgres computes both groupings in a single scan with GROUPING SETS.
+    SQLite has no GROUPING SETS and runs the equivalent UNION ALL of the two
+    GROUP BYs instead. Day rows are the ones with a sale_date.
+    """
+    rollup = DailySalesRollup.query.filter(
+        DailySalesRollup.sale_date >= start_date.date(),
+        DailySalesRollup.sale_date <= end_date.date(),
+    ).subquery()
+    totals = [
+        func.sum(getattr(rollup.c, column)).label(column)
+        for column in ROLLUP_TOTAL_COLUMNS
+    ]
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        groups = db.select(
+            rollup.c.product_id, rollup.c.size, rollup.c.sale_date, *totals
+        ).group_by(
+            func.grouping_sets(
+                db.tuple_(rollup.c.product_id, rollup.c.size),
+                db.tuple_(rollup.c.sale_date),
+            )
+        )
+    else:
+        groups = db.union_all(
+            db.select(
+                rollup.c.product_id,
+                rollup.c.size,
+                db.literal(None, db.Date).label("sale_date"),
+                *totals,
+            ).group_by(rollup.c.product_id, rollup.c.size),
+            db.select(
+                db.literal(None, db.Integer),
+                db.literal(None, db.String),
+                rollup.c.sale_date,
+                *totals,
+            ).group_by(rollup.c.sale_date),
+        )
+    groups = groups.subquery()
+
+    # Product details are joined to the few grouped rows, not the raw rollup
+    return db.session.execute(
+        db.select(
+            groups,
+            Product.id.label("catalog_product_id"),
+            Product.image_url,
+            Product.style_url,
+            Product.selling_price,
+            Product.season,
+        ).outerjoin(Product, Product.id == groups.c.product_id)
+    )
+
+
+def report_sales_aggregates(start_date, end_date):
+    """Sales aggregates, margins, sell-through and trends for a date range.
+
+    Loads the product/size and day groupings (one statement) and the stock
+    on hand into arrays and computes every breakdown from those.
+    """
+    cells = []
+    days = []
+    details = {}
+    for (
+        product_id,
+        size,
+        sale_date,
+        sales_count,
+        units,
+        revenue,
+        cost,
+        profit,
+        catalog_product_id,
+        image_url,
+        style_url,
+        selling_price,
+        season,
+    ) in report_sales_groups(start_date, end_date):
+        if sale_date is not None:
+            days.append((sale_date, sales_count, units, revenue, profit))
+            continue
+        cells.append(
+            (product_id, size, season, sales_count, units, revenue, cost, profit, 0)
+        )
+        # Sales of deleted products count in the totals but are not listed
+        if catalog_product_id is not None:
+            details[product_id] = (image_url, style_url, selling_price)
+
+    # Stock on hand joins as cells without sales, for the sell-through rates
+    stock = db.session.query(
+        SizeQuantity.product_id,
+        SizeQuantity.size,
+        Product.season,
+        SizeQuantity.quantity,
+    ).join(Product)
+    cells += [
+        (product_id, size, season, 0, 0, 0, 0, 0, quantity)
+        for product_id, size, season, quantity in stock
+    ]
+
+    product_ids, sizes, seasons, *measures = analytics.to_columns(
+        cells, (np.int64, object, object) + REPORT_MEASURE_DTYPES
+    )
+    summary = SalesSummary(None, None, None, None, None)
+    if measures[0].any():
+        summary = SalesSummary(*(column.sum().item() for column in measures[:5]))
+
+    product_performance = sorted(
+        (
+            ProductPerformance(product_id, *details[product_id], *totals)
+            for product_id, _, *totals in analytics.breakdown(product_ids, measures)
+            if product_id in details
+        ),
+        key=lambda product: (-product.profit, product.id),
+    )
+    size_performance = sorted(
+        (
+            SizePerformance(size, sales_count, units, revenue, margin, rate)
+            for size, sales_count, units, revenue, _, _, margin, rate in (
+                analytics.breakdown(sizes, measures)
+            )
+        ),
+        key=lambda size: (-size.total_quantity, size.size or ""),
+    )
+    season_performance = sorted(
+        (
+            SeasonPerformance(season, units, revenue, profit, margin, rate)
+            for season, _, units, revenue, _, profit, margin, rate in (
+                analytics.breakdown(seasons, measures)
+            )
+            if season is not None
+        ),
+        key=lambda season: -season.revenue,
+    )
+
+    days.sort()
+    dates, *day_totals = analytics.to_columns(
+        days, ("datetime64[D]", np.int64, np.int64, np.float64, np.float64)
+    )
+    revenue_trends = [
+        analytics.trailing_mean(dates, day_totals[2], start_date.date(), window)
+        for window in (7, 30)
+    ]
+    daily_sales = [
+        DailySales(*values)
+        for values in zip(
+            [day[0] for day in days],
+            *(column.tolist() for column in day_totals + revenue_trends),
+        )
+    ]
+    weekday_sales = [
+        WeekdaySales(*values)
+        for values in zip(
+            analytics.WEEKDAYS,
+            *(
+                column.tolist()
+                for column in analytics.group_sums(
+                    analytics.weekdays(dates), 7, *day_totals
+                )
+            ),
+        )
+    ]
+
+    return {
+        "sales_summary": summary,
+        "product_performance": product_performance,
+        "size_performance": size_performance,
+        "season_performance": season_performance,
+        "daily_sales": daily_sales,
+        "weekday_sales": weekday_sales,
+    }
+
+
+def inventory_value_totals():
+    """Cost, selling value and units of the stock currently on hand"""
+    return (
+        db.session.query(
+            func.sum(Product.unit_cost * SizeQuantity.quantity).label(
+                "total_inventory_cost"
+            ),
+            func.sum(Product.selling_price * SizeQuantity.quantity).label(
+                "total_inventory_value"
+            ),
+            func.sum(SizeQuantity.quantity).label("total_units_in_stock"),
+        )
+        .join(SizeQuantity)
+        .first()
+    )
+
+
 # Replace the existing /report route in app.py with this updated version
 
 
@@ -640,9 +2456,9 @@ def export_sales():
 @login_required
 @admin_required
 def report():
-    # Default to last 30 days
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
+    # Default to last 30 days (whole days, matching the daily rollup)
+    end_date = datetime.now().replace(hour=23, minute=59, second=59, microsecond=0)
+    start_date = (end_date - timedelta(days=30)).replace(hour=0, minute=0, second=0)
 
     if request.method == "POST":
         start_date_str = request.form.get("start_date")
@@ -654,97 +2470,17 @@ def report():
             # Add 23:59:59 to end_date to include the entire day
             end_date = end_date.replace(hour=23, minute=59, second=59)
 
-    # Create a subquery for non-reverted sales
-    non_reverted_sales = (
-        db.session.query(Sale)
-        .outerjoin(SaleRevert, Sale.id == SaleRevert.sale_id)
-        .filter(SaleRevert.id.is_(None))
-        .filter(Sale.timestamp >= start_date, Sale.timestamp <= end_date)
-        .subquery()
-    )
-
-    # 1. Sales Summary (excluding reverted sales)
-    sales_summary = db.session.query(
-        func.count(non_reverted_sales.c.id).label("total_sales"),
-        func.sum(non_reverted_sales.c.quantity).label("total_units_sold"),
-        func.sum(
-            non_reverted_sales.c.selling_price * non_reverted_sales.c.quantity
-        ).label("total_revenue"),
-        func.sum(non_reverted_sales.c.unit_cost * non_reverted_sales.c.quantity).label(
-            "total_cost"
-        ),
-        func.sum(
-            (non_reverted_sales.c.selling_price - non_reverted_sales.c.unit_cost)
-            * non_reverted_sales.c.quantity
-        ).label("total_profit"),
-    ).first()
-
-    # 2. Product Performance (excluding reverted sales)
-    product_performance = (
-        db.session.query(
-            Product.id,
-            Product.image_url,
-            Product.style_url,
-            Product.selling_price,
-            func.sum(non_reverted_sales.c.quantity).label("units_sold"),
-            func.sum(
-                non_reverted_sales.c.selling_price * non_reverted_sales.c.quantity
-            ).label("revenue"),
-            func.sum(
-                non_reverted_sales.c.unit_cost * non_reverted_sales.c.quantity
-            ).label("cost"),
-            func.sum(
-                (non_reverted_sales.c.selling_price - non_reverted_sales.c.unit_cost)
-                * non_reverted_sales.c.quantity
-            ).label("profit"),
-        )
-        .join(non_reverted_sales, Product.id == non_reverted_sales.c.product_id)
-        .group_by(Product.id)
-        .order_by(desc("profit"))
-        .all()
-    )
-
-    # 3. Size Performance (excluding reverted sales)
-    size_performance = (
-        db.session.query(
-            non_reverted_sales.c.size,
-            func.count(non_reverted_sales.c.id).label("sales_count"),
-            func.sum(non_reverted_sales.c.quantity).label("total_quantity"),
-            func.sum(
-                non_reverted_sales.c.selling_price * non_reverted_sales.c.quantity
-            ).label("total_revenue"),
-        )
-        .group_by(non_reverted_sales.c.size)
-        .order_by(desc("total_quantity"))
-        .all()
-    )
-
-    # 4. Daily Sales Trend (excluding reverted sales)
-    daily_sales = (
-        db.session.query(
-            func.date(non_reverted_sales.c.timestamp).label("sale_date"),
-            func.count(non_reverted_sales.c.id).label("sales_count"),
-            func.sum(non_reverted_sales.c.quantity).label("units_sold"),
-            func.sum(
-                non_reverted_sales.c.selling_price * non_reverted_sales.c.quantity
-            ).label("revenue"),
-            func.sum(
-                (non_reverted_sales.c.selling_price - non_reverted_sales.c.unit_cost)
-                * non_reverted_sales.c.quantity
-            ).label("profit"),
-        )
-        .group_by(func.date(non_reverted_sales.c.timestamp))
-        .order_by("sale_date")
-        .all()
+    # Sales aggregates and inventory value are cached until the next write
+    aggregates = query_cache.get_or_compute(
+        ("report", start_date, end_date),
+        lambda: report_sales_aggregates(start_date, end_date),
     )
+    product_performance = aggregates["product_performance"]
 
-    # 5. Low Stock Items (this doesn't need to change)
-    low_stock_items = (
-        db.session.query(Product, SizeQuantity)
-        .join(SizeQuantity)
-        .filter(SizeQuantity.quantity <= 2)
-        .order_by(SizeQuantity.quantity)
-        .all()
+    # 5. Low stock sizes and sold-out products, both index lookups
+    low_stock_items = low_stock_query().order_by(SizeQuantity.quantity).all()
+    out_of_stock_products = (
+        Product.query.filter(Product.total_units == 0).order_by(Product.id).all()
     )
 
     # 6. Top Performing Products (by profit)
@@ -753,53 +2489,32 @@ def report():
     # 7. Worst Performing Products (by profit)
     worst_products = product_performance[-5:] if len(product_performance) >= 5 else []
 
-    # 8. Current Inventory Value (this doesn't need to change)
-    inventory_value = (
-        db.session.query(
-            func.sum(Product.unit_cost * SizeQuantity.quantity).label(
-                "total_inventory_cost"
-            ),
-            func.sum(Product.selling_price * SizeQuantity.quantity).label(
-                "total_inventory_value"
-            ),
-            func.sum(SizeQuantity.quantity).label("total_units_in_stock"),
-        )
-        .join(SizeQuantity)
-        .first()
+    # 8. Current Inventory Value
+    inventory_value = query_cache.get_or_compute(
+        ("inventory_value",), inventory_value_totals
     )
 
     return render_template(
         "report.html",
         start_date=start_date,
         end_date=end_date,
-        sales_summary=sales_summary,
+        sales_summary=aggregates["sales_summary"],
         product_performance=product_performance,
-        size_performance=size_performance,
-        daily_sales=daily_sales,
+        size_performance=aggregates["size_performance"],
+        season_performance=aggregates["season_performance"],
+        daily_sales=aggregates["daily_sales"],
+        weekday_sales=aggregates["weekday_sales"],
         low_stock_items=low_stock_items,
+        out_of_stock_products=out_of_stock_products,
         top_products=top_products,
         worst_products=worst_products,
         inventory_value=inventory_value,
     )
 
 
-@app.route("/export_detailed_report")
-@login_required
-@admin_required
-def export_detailed_report():
-    # Get date range from query parameters
-    start_date_str = request.args.get("start_date")
-    end_date_str = request.args.get("end_date")
-
-    if start_date_str and end_date_str:
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
-        end_date = end_date.replace(hour=23, minute=59, second=59)
-    else:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-
-    # Get all sales data excluding reverted sales
+def detailed_report_csv(start_date, end_date):
+    """Header and rows of the detailed sales report for a date range"""
+    # Get all sales data excluding reverted sales, streamed in batches
     sales_data = (
         db.session.query(
             Sale.timestamp,
@@ -811,58 +2526,449 @@ def export_detailed_report():
             ((Sale.selling_price - Sale.unit_cost) * Sale.quantity).label("profit"),
         )
         .join(Product)
-        .outerjoin(SaleRevert, Sale.id == SaleRevert.sale_id)
         .filter(Sale.timestamp >= start_date, Sale.timestamp <= end_date)
-        .filter(SaleRevert.id.is_(None))  # Only include non-reverted sales
+        .filter(Sale.reverted_at.is_(None))  # Only include non-reverted sales
         .order_by(Sale.timestamp.desc())
-        .all()
+        .yield_per(CSV_STREAM_BATCH_SIZE)
     )
 
-    # Create CSV
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(
+    header = [
+        "Date",
+        "Product ID",
+        "Size",
+        "Quantity",
+        "Selling Price",
+        "Unit Cost",
+        "Total Revenue",
+        "Total Cost",
+        "Profit",
+    ]
+    rows = (
         [
-            "Date",
-            "Product ID",
-            "Size",
-            "Quantity",
-            "Selling Price",
-            "Unit Cost",
-            "Total Revenue",
-            "Total Cost",
-            "Profit",
+            sale.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            sale.product_id,
+            sale.size,
+            sale.quantity,
+            f"{sale.selling_price:.0f}",
+            f"{sale.unit_cost:.0f}",
+            f"{sale.selling_price * sale.quantity:.0f}",
+            f"{sale.unit_cost * sale.quantity:.0f}",
+            f"{sale.profit:.0f}",
         ]
+        for sale in sales_data
     )
+    return header, rows
+
+
+def product_performance_csv(start_date, end_date):
+    """Header and rows of the report's product performance for a date range"""
+    header = [
+        "Product ID",
+        "Selling Price",
+        "Units Sold",
+        "Revenue",
+        "Cost",
+        "Profit",
+    ]
+    rows = (
+        [
+            product.id,
+            f"{product.selling_price:.0f}",
+            product.units_sold,
+            f"{product.revenue:.0f}",
+            f"{product.cost:.0f}",
+            f"{product.profit:.0f}",
+        ]
+        for product in report_sales_aggregates(start_date, end_date)[
+            "product_performance"
+        ]
+    )
+    return header, rows
 
-    for sale in sales_data:
-        total_revenue = sale.selling_price * sale.quantity
-        total_cost = sale.unit_cost * sale.quantity
-        writer.writerow(
-            [
-                sale.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                sale.product_id,
-                sale.size,
-                sale.quantity,
-                f"{sale.selling_price:.0f}",
-                f"{sale.unit_cost:.0f}",
-                f"{total_revenue:.0f}",
-                f"{total_cost:.0f}",
-                f"{sale.profit:.0f}",
-            ]
-        )
 
-    output = si.getvalue()
-    si.close()
+@app.route("/export_detailed_report")
+@login_required
+@admin_required
+def export_detailed_report():
+    # Get date range from query parameters
+    start_date_str = request.args.get("start_date")
+    end_date_str = request.args.get("end_date")
+
+    if start_date_str and end_date_str:
+        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+        end_date = end_date.replace(hour=23, minute=59, second=59)
+    else:
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=30)
 
     filename = f"detailed_report_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.csv"
     return Response(
-        output,
+        stream_with_context(stream_csv(*detailed_report_csv(start_date, end_date))),
         mimetype="text/csv",
         headers={"Content-Disposition": f"attachment;filename={filename}"},
     )
 
 
+# Background report jobs. Heavy reports and exports are queued in the
+# report_job table and generated by `flask report-worker` processes, which
+# write the CSV files to REPORT_JOB_DIR for the web workers to serve.
+REPORT_JOB_KINDS = {
+    "detailed_report": "Detailed sales report",
+    "product_performance": "Product performance",
+    "sales_export": "All sales",
+}
+REPORT_JOB_DIR = os.environ.get("REPORT_JOB_DIR") or os.path.join(
+    app.instance_path, "report_jobs"
+)
+REPORT_JOB_POLL_SECONDS = float(os.environ.get("REPORT_JOB_POLL_SECONDS", 2))
+# A job running longer than this is assumed to have lost its worker
+REPORT_JOB_LEASE_SECONDS = int(os.environ.get("REPORT_JOB_LEASE_SECONDS", 1800))
+REPORT_JOB_LIST_SIZE = 20
+
+
+class ReportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    start_date = db.Column(db.Date)  # No range for the all-sales export
+    end_date = db.Column(db.Date)
+    # Sales history the artifact reflects, see sales_data_version()
+    data_version = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    # "host:pid" of the worker running it, see requeue_orphaned_report_jobs()
+    claimed_by = db.Column(db.String(255))
+    finished_at = db.Column(db.DateTime)
+    file_name = db.Column(db.String(255))
+    row_count = db.Column(db.Integer)
+    error = db.Column(db.Text)
+
+    def download_name(self):
+        if self.kind == "sales_export":
+            return "sales_report.csv"
+        return (
+            f"{self.kind}_{self.start_date.strftime('%Y%m%d')}_"
+            f"{self.end_date.strftime('%Y%m%d')}.csv"
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "start_date": self.start_date.isoformat() if self.start_date else None,
+            "end_date": self.end_date.isoformat() if self.end_date else None,
+            "status": self.status,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished_at": (
+                self.finished_at.strftime("%Y-%m-%d %H:%M:%S")
+                if self.finished_at
+                else None
+            ),
+            "row_count": self.row_count,
+            "error": self.error,
+            "download_url": (
+                url_for("download_report_job", job_id=self.id)
+                if self.status == "done"
+                else None
+            ),
+        }
+
+
+def sales_data_version():
+    """Fingerprint of the sales history; changes with every sale or revert"""
+    sales = db.session.query(func.count(Sale.id), func.max(Sale.id)).one()
+    reverts = db.session.query(func.count(SaleRevert.id), func.max(SaleRevert.id)).one()
+    return "{}:{}:{}:{}".format(*sales, *reverts)
+
+
+def request_report_job(kind, start_date, end_date, user_id):
+    """Queue a report job, or return the existing one for the same data.
+
+    A finished artifact is reused while the sales history is unchanged, as
+    is a job for the same range that is still queued or running. Returns
+    (job, reused).
+    """
+    version = sales_data_version()
+    job = (
+        ReportJob.query.filter_by(
+            kind=kind, start_date=start_date, end_date=end_date, data_version=version
+        )
+        .filter(ReportJob.status.in_(("queued", "running", "done")))
+        .order_by(ReportJob.id.desc())
+        .first()
+    )
+    if job and (
+        job.status != "done"
+        or os.path.exists(os.path.join(REPORT_JOB_DIR, job.file_name))
+    ):
+        return job, True
+
+    job = ReportJob(
+        kind=kind,
+        start_date=start_date,
+        end_date=end_date,
+        data_version=version,
+        requested_by=user_id,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job, False
+
+
+def claim_report_job():
+    """Mark the oldest waiting job as running and return it, or None.
+
+    Uses a conditional UPDATE like decrement_stock, so when several workers
+    race for the same job only one of them gets it.
+    """
+    claimable = or_(
+        ReportJob.status == "queued",
+        and_(
+            ReportJob.status == "running",
+            ReportJob.started_at
+            < datetime.now() - timedelta(seconds=REPORT_JOB_LEASE_SECONDS),
+        ),
+    )
+    job_id = (
+        db.session.query(ReportJob.id)
+        .filter(claimable)
+        .order_by(ReportJob.id)
+        .limit(1)
+        .scalar()
+    )
+    claimed = False
+    if job_id is not None:
+        result = db.session.execute(
+            db.update(ReportJob)
+            .where(ReportJob.id == job_id, claimable)
+            .values(
+                status="running",
+                started_at=datetime.now(),
+                claimed_by=report_worker_id(),
+                error=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        claimed = result.rowcount > 0
+    # Ends the transaction so an idle worker holds no snapshot open
+    db.session.commit()
+    return db.session.get(ReportJob, job_id) if claimed else None
+
+
+def run_report_job(job):
+    """Generate a claimed job's CSV file and record the outcome"""
+    file_name = f"{job.id}_{job.kind}.csv"
+    path = os.path.join(REPORT_JOB_DIR, file_name)
+    try:
+        # Assigned once the file is written: changing the row now would hold a
+        # write lock (a SQLite-wide one) while the file is generated
+        data_version = sales_data_version()
+        if job.kind == "sales_export":
+            header, rows = sales_export_csv()
+        else:
+            start_date = datetime.combine(job.start_date, datetime.min.time())
+            end_date = datetime.combine(job.end_date, datetime.max.time()).replace(
+                microsecond=0
+            )
+            if job.kind == "detailed_report":
+                header, rows = detailed_report_csv(start_date, end_date)
+            else:
+                header, rows = product_performance_csv(start_date, end_date)
+
+        os.makedirs(REPORT_JOB_DIR, exist_ok=True)
+        row_count = 0
+        # Written under a temporary name so a download never sees half a file
+        with open(path + ".part", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow(row)
+                row_count += 1
+        os.replace(path + ".part", path)
+
+        job.status = "done"
+        job.data_version = data_version
+        job.file_name = file_name
+        job.row_count = row_count
+        job.finished_at = datetime.now()
+
+        # Older artifacts for the same range are out of date now
+        superseded = ReportJob.query.filter(
+            ReportJob.kind == job.kind,
+            ReportJob.start_date == job.start_date,
+            ReportJob.end_date == job.end_date,
+            ReportJob.status == "done",
+            ReportJob.id < job.id,
+        ).all()
+        for old_job in superseded:
+            old_path = os.path.join(REPORT_JOB_DIR, old_job.file_name)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+            old_job.status = "expired"
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+        job.status = "failed"
+        job.error = str(e)
+        job.finished_at = datetime.now()
+        db.session.commit()
+
+
+def report_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
+
+
+def requeue_orphaned_report_jobs():
+    """Put back running jobs whose worker on this host is gone.
+
+    Called by an idle worker, so a job it claimed itself is orphaned too (its
+    run was interrupted by an error). Jobs of workers on other hosts are
+    left to the REPORT_JOB_LEASE_SECONDS lease in claim_report_job().
+    """
+    host = socket.gethostname()
+    own_pid = os.getpid()
+    orphaned = []
+    for job_id, claimed_by in db.session.query(
+        ReportJob.id, ReportJob.claimed_by
+    ).filter(ReportJob.status == "running", ReportJob.claimed_by.like(f"{host}:%")):
+        pid = int(claimed_by.rpartition(":")[2])
+        if pid == own_pid or not process_alive(pid):
+            orphaned.append((job_id, claimed_by))
+    for job_id, claimed_by in orphaned:
+        # Conditional like claim_report_job, in case another worker got there
+        db.session.execute(
+            db.update(ReportJob)
+            .where(
+                ReportJob.id == job_id,
+                ReportJob.status == "running",
+                ReportJob.claimed_by == claimed_by,
+            )
+            .values(status="queued", started_at=None, claimed_by=None)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return len(orphaned)
+
+
+@app.cli.command("report-worker")
+@click.option("--once", is_flag=True, help="Exit once the queue is empty.")
+def report_worker(once):
+    """Generate queued report jobs; run as one or more separate processes"""
+    print(f"Report worker {os.getpid()} watching for jobs.")
+    failures = 0
+    while True:
+        try:
+            requeued = requeue_orphaned_report_jobs()
+            if requeued:
+                print(f"Requeued {requeued} interrupted report job(s).")
+            job = claim_report_job()
+            if job is not None:
+                print(f"Generating report job #{job.id} ({job.kind}).")
+                run_report_job(job)
+                print(f"Report job #{job.id} {job.status}.")
+                failures = 0
+                continue
+            failures = 0
+        except Exception:
+            # E.g. the database is unreachable: keep the worker alive and retry
+            # with a growing delay instead of exiting
+            db.session.rollback()
+            failures += 1
+            delay = min(REPORT_JOB_POLL_SECONDS * 2**failures, 60)
+            app.logger.exception("Report worker error, retrying in %ss", delay)
+            time.sleep(delay)
+            continue
+        if once:
+            break
+        time.sleep(REPORT_JOB_POLL_SECONDS)
+
+
+@app.route("/report-jobs", methods=["GET", "POST"])
+@login_required
+@admin_required
+def report_jobs():
+    if request.method == "POST":
+        kind = request.form.get("kind")
+        if kind not in REPORT_JOB_KINDS:
+            flash("Unknown report type.", "danger")
+            return redirect(url_for("report_jobs"))
+
+        start_date = end_date = None
+        if kind != "sales_export":
+            try:
+                start_date = datetime.strptime(
+                    request.form["start_date"], "%Y-%m-%d"
+                ).date()
+                end_date = datetime.strptime(
+                    request.form["end_date"], "%Y-%m-%d"
+                ).date()
+            except (KeyError, ValueError):
+                flash("Please choose a valid date range.", "danger")
+                return redirect(url_for("report_jobs"))
+
+        job, reused = request_report_job(kind, start_date, end_date, current_user.id)
+
+        if request.args.get("format") == "json":
+            return jsonify({"job": job.to_dict(), "reused": reused}), 202
+        if reused and job.status == "done":
+            flash(f"Job #{job.id} already has this report up to date.", "info")
+        elif reused:
+            flash(f"Job #{job.id} is already generating this report.", "info")
+        else:
+            flash(f"Job #{job.id} queued.", "success")
+        return redirect(url_for("report_jobs"))
+
+    jobs = (
+        ReportJob.query.order_by(ReportJob.id.desc()).limit(REPORT_JOB_LIST_SIZE).all()
+    )
+    today = datetime.now().date()
+    return render_template(
+        "report_jobs.html",
+        jobs=jobs,
+        kinds=REPORT_JOB_KINDS,
+        start_date=today - timedelta(days=30),
+        end_date=today,
+    )
+
+
+@app.route("/report-jobs/<int:job_id>")
+@login_required
+@admin_required
+def report_job_status(job_id):
+    return jsonify(ReportJob.query.get_or_404(job_id).to_dict())
+
+
+@app.route("/report-jobs/<int:job_id>/download")
+@login_required
+@admin_required
+def download_report_job(job_id):
+    job = ReportJob.query.get_or_404(job_id)
+    path = os.path.join(REPORT_JOB_DIR, job.file_name or "")
+    if job.status != "done" or not os.path.exists(path):
+        flash("That report is not available any more.", "danger")
+        return redirect(url_for("report_jobs"))
+    return send_file(
+        path,
+        mimetype="text/csv",
+        as_attachment=True,
+        download_name=job.download_name(),
+    )
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     # If user is already logged in, redirect to home
@@ -876,6 +2982,12 @@ def login():
 
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
+            # Upgrade (or downgrade) the hash to the configured work factor
+            if user.needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+                user_cache.invalidate()
+
             # Pass remember parameter to login_user
             login_user(user, remember=bool(remember_me))
 
@@ -921,32 +3033,49 @@ def recent_sales():
     from_datetime = datetime.combine(from_date, datetime.min.time())
     to_datetime = datetime.combine(to_date, datetime.max.time())
 
+    # Page through the rows newest first; "before" is the last sale id shown
+    before_id = request.args.get("before", type=int)
+
     # Get sales within the date range that haven't been reverted
-    # Using LEFT JOIN to exclude sales that have been reverted
-    recent_sales = (
+    query = (
         db.session.query(Sale, Product)
         .join(Product)
-        .outerjoin(SaleRevert, Sale.id == SaleRevert.sale_id)
         .filter(Sale.timestamp >= from_datetime)
         .filter(Sale.timestamp <= to_datetime)
-        .filter(
-            SaleRevert.id.is_(None)
-        )  # Only include sales that haven't been reverted
-        .order_by(Sale.timestamp.desc())
+        .filter(Sale.reverted_at.is_(None))
+    )
+    query = apply_history_cursor(query, Sale.timestamp, Sale.id, before_id)
+    recent_sales = (
+        query.order_by(Sale.timestamp.desc(), Sale.id.desc())
+        .limit(HISTORY_PAGE_SIZE + 1)
         .all()
     )
-
-    # Calculate summary statistics (only for non-reverted sales)
-    total_sales = len(recent_sales)
-    total_quantity = sum(sale.quantity for sale, product in recent_sales)
-    total_amount = sum(
-        sale.selling_price * sale.quantity for sale, product in recent_sales
+    next_before = (
+        recent_sales[HISTORY_PAGE_SIZE - 1][0].id
+        if len(recent_sales) > HISTORY_PAGE_SIZE
+        else None
+    )
+    recent_sales = recent_sales[:HISTORY_PAGE_SIZE]
+
+    # Calculate summary statistics (only for non-reverted sales) in SQL,
+    # cached until the next write
+    totals = query_cache.get_or_compute(
+        ("recent_sales", from_datetime, to_datetime),
+        lambda: db.session.query(
+            func.count(Sale.id).label("total_sales"),
+            func.sum(Sale.quantity).label("total_quantity"),
+            func.sum(Sale.selling_price * Sale.quantity).label("total_amount"),
+        )
+        .filter(Sale.timestamp >= from_datetime)
+        .filter(Sale.timestamp <= to_datetime)
+        .filter(Sale.reverted_at.is_(None))
+        .first(),
     )
 
     stats = {
-        "total_sales": total_sales,
-        "total_quantity": total_quantity,
-        "total_amount": int(total_amount),
+        "total_sales": totals.total_sales,
+        "total_quantity": totals.total_quantity or 0,
+        "total_amount": int(totals.total_amount or 0),
         "from_date": from_date,
         "to_date": to_date,
     }
@@ -957,6 +3086,8 @@ def recent_sales():
         stats=stats,
         from_date=from_date.strftime("%Y-%m-%d"),
         to_date=to_date.strftime("%Y-%m-%d"),
+        before_id=before_id,
+        next_before=next_before,
     )
 
 
@@ -969,9 +3100,8 @@ def revert_sale(sale_id):
         # Get the sale record
         sale = Sale.query.get_or_404(sale_id)
 
-        # Check if sale was already reverted
-        existing_revert = SaleRevert.query.filter_by(sale_id=sale_id).first()
-        if existing_revert:
+        # Check if sale was already reverted, and mark it reverted if not
+        if not mark_sale_reverted(sale_id):
             flash("This sale has already been reverted!", "danger")
             return redirect(url_for("recent_sales"))
 
@@ -987,9 +3117,11 @@ def revert_sale(sale_id):
                 product_id=sale.product_id, size=sale.size, quantity=0
             )
             db.session.add(size_entry)
+            db.session.flush()
+            refresh_search_documents([sale.product_id])
 
         # Restore the quantity back to inventory
-        size_entry.quantity += sale.quantity
+        increment_stock(size_entry.id, sale.quantity)
 
         # Get the reason from the form (optional)
         reason = request.form.get("reason", "")
@@ -1006,9 +3138,14 @@ def revert_sale(sale_id):
             reason=reason,
         )
         db.session.add(revert_record)
+        update_sales_rollup(sale, sign=-1)
+        refresh_stock_totals([sale.product_id])
+        bump_product_versions([sale.product_id])
 
         # Commit all changes
         db.session.commit()
+        query_cache.invalidate()
+        SALES_REVERTED.inc()
 
         flash(
             f"Sale reverted successfully! {sale.quantity} unit(s) of size {sale.size} restored to inventory.",
@@ -1027,36 +3164,63 @@ def revert_sale(sale_id):
 @login_required
 @admin_required
 def revert_history():
-    reverts = (
+    # Page through the reverts newest first; "before" is the last revert id
+    before_id = request.args.get("before", type=int)
+
+    query = (
         db.session.query(SaleRevert, Product, User)
         .join(Product, SaleRevert.product_id == Product.id)
         .join(User, SaleRevert.reverted_by == User.id)
-        .order_by(SaleRevert.revert_timestamp.desc())
+    )
+    reverts = (
+        apply_history_cursor(
+            query, SaleRevert.revert_timestamp, SaleRevert.id, before_id
+        )
+        .order_by(SaleRevert.revert_timestamp.desc(), SaleRevert.id.desc())
+        .limit(HISTORY_PAGE_SIZE + 1)
         .all()
     )
-
-    # Calculate statistics
-    total_reverts = len(reverts)
-    total_quantity = sum(revert.quantity for revert, _, _ in reverts)
-    total_amount = sum(
-        revert.selling_price * revert.quantity for revert, _, _ in reverts
+    next_before = (
+        reverts[HISTORY_PAGE_SIZE - 1][0].id
+        if len(reverts) > HISTORY_PAGE_SIZE
+        else None
     )
+    reverts = reverts[:HISTORY_PAGE_SIZE]
 
-    # Calculate this month (last 30 days)
+    # Calculate statistics over all reverts with one aggregate query
+    # ("this month" is the last 30 days)
     thirty_days_ago = datetime.now() - timedelta(days=30)
-    this_month_count = sum(
-        1 for revert, _, _ in reverts if revert.revert_timestamp >= thirty_days_ago
+    totals = (
+        db.session.query(
+            func.count(SaleRevert.id).label("total_reverts"),
+            func.sum(SaleRevert.quantity).label("total_quantity"),
+            func.sum(SaleRevert.selling_price * SaleRevert.quantity).label(
+                "total_amount"
+            ),
+            func.sum(
+                case((SaleRevert.revert_timestamp >= thirty_days_ago, 1), else_=0)
+            ).label("this_month_count"),
+        )
+        .join(Product, SaleRevert.product_id == Product.id)
+        .join(User, SaleRevert.reverted_by == User.id)
+        .first()
     )
 
     # Pass the calculated statistics to the template
     stats = {
-        "total_reverts": total_reverts,
-        "total_quantity": total_quantity,
-        "total_amount": int(total_amount),
-        "this_month_count": this_month_count,
+        "total_reverts": totals.total_reverts,
+        "total_quantity": totals.total_quantity or 0,
+        "total_amount": int(totals.total_amount or 0),
+        "this_month_count": totals.this_month_count or 0,
     }
 
-    return render_template("revert_history.html", reverts=reverts, stats=stats)
+    return render_template(
+        "revert_history.html",
+        reverts=reverts,
+        stats=stats,
+        before_id=before_id,
+        next_before=next_before,
+    )
 
 
 # Add this route to get sale details via AJAX - FIXED VERSION
@@ -1069,7 +3233,11 @@ def sale_details(sale_id):
         product = Product.query.get_or_404(sale.product_id)
 
         # Check if already reverted
-        existing_revert = SaleRevert.query.filter_by(sale_id=sale_id).first()
+        existing_revert = (
+            SaleRevert.query.filter_by(sale_id=sale_id).first()
+            if sale.is_reverted
+            else None
+        )
 
         return jsonify(
             {
@@ -1110,18 +3278,55 @@ def sale_details(sale_id):
         return jsonify({"error": str(e)}), 500
 
 
-# Add this temporary route to check your database
-@app.route("/debug-tables")
+@app.route("/cache-stats")
 @login_required
 @admin_required
-def debug_tables():
-    try:
-        # Check if SaleRevert table exists
-        reverts = SaleRevert.query.count()
-        sales = Sale.query.count()
-        return f"SaleRevert records: {reverts}, Sale records: {sales}"
-    except Exception as e:
-        return f"Database error: {str(e)}"
+def cache_stats():
+    # Counters are per worker process; each worker answers for itself
+    return jsonify(query_cache.stats())
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of the request, pool, cache and sales metrics.
+
+    Scrapers authenticate with "Authorization: Bearer $METRICS_TOKEN";
+    without a token configured only a logged-in admin can read it.
+    """
+    token = os.environ.get("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    elif not (current_user.is_authenticated and current_user.is_admin()):
+        return Response("Forbidden\n", status=403, mimetype="text/plain")
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Aggregate the samples every worker process has written
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+@app.route("/performance")
+@login_required
+@admin_required
+def performance():
+    return render_template(
+        "performance.html",
+        profiling_enabled=app.config["PROFILE_REQUESTS"],
+        slow_request_ms=app.config["SLOW_REQUEST_MS"],
+        window=request_profiler.window,
+        endpoints=request_profiler.summary(),
+        cache=query_cache.stats(),
+        table_counts={
+            "Products": Product.query.count(),
+            "Sales": Sale.query.count(),
+            "Sale reverts": SaleRevert.query.count(),
+        },
+    )
 
 
 if __name__ == "__main__":
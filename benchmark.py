@@ -0,0 +1,393 @@
+"""Benchmark the main routes against a synthetic store database.
+
+Seeds a throwaway database with generated products, sizes, sales and
+reverts, drives each route through the Flask test client and reports
+latency percentiles, SQL query counts and peak Python memory per route.
+
+Usage:
+    python benchmark.py --products 2000 --sales 50000 --output bench.json
+    python benchmark.py --database-url postgresql://localhost/zuzi_bench
+    python benchmark.py --compare bench.json   # diff against an earlier run
+    python benchmark.py --sales 1000000 --cold-cache --routes report_30d,report_1y
+    BCRYPT_LOG_ROUNDS=10 python benchmark.py --routes login,auth_request
+
+The database is created from scratch on every run, so never point
+--database-url at a database you care about.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+SIZE_NAMES = ["2T", "3T", "4T", "5T", "6", "7", "8", "10", "12", "14"]
+SEASONS = ["Summer", "Winter", "Spring/Autumn"]
+GENDERS = ["Boys", "Girls"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--sizes-per-product", type=int, default=4)
+    parser.add_argument("--sales", type=int, default=20000)
+    parser.add_argument("--reverts", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365, help="sales history span")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--database-url",
+        help="database to seed (default: a temporary SQLite file)",
+    )
+    parser.add_argument(
+        "--cold-cache",
+        action="store_true",
+        help="invalidate the aggregate and user caches before every request",
+    )
+    parser.add_argument("--routes", help="comma separated subset of routes to run")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    return parser.parse_args()
+
+
+def seed_store(app_module, args):
+    """Fill the database with a reproducible synthetic store"""
+    db = app_module.db
+    rnd = random.Random(args.seed)
+    sizes = SIZE_NAMES[: args.sizes_per_product]
+
+    db.drop_all()
+    db.create_all()
+    app_module.init_db()
+    admin = app_module.User.query.filter_by(username="admin").first()
+
+    products = []
+    for _ in range(args.products):
+        unit_cost = rnd.uniform(4000, 15000)
+        products.append(
+            {
+                "image_url": "https://example.com/product.jpg",
+                "style_url": "https://example.com/style",
+                "total_cost": unit_cost * 10,
+                "shipping_cost": 0,
+                "unit_cost": unit_cost,
+                "selling_price": round((unit_cost + 7000) / 1000) * 1000,
+                "season": rnd.choice(SEASONS),
+                "gender": rnd.choice(GENDERS),
+            }
+        )
+    db.session.execute(db.insert(app_module.Product), products)
+    product_ids = [row[0] for row in db.session.query(app_module.Product.id)]
+
+    # Plenty of stock so the sell benchmark never runs out
+    db.session.execute(
+        db.insert(app_module.SizeQuantity),
+        [
+            {"product_id": product_id, "size": size, "quantity": rnd.randint(0, 50)}
+            for product_id in product_ids
+            for size in sizes
+        ],
+    )
+    db.session.execute(
+        db.update(app_module.SizeQuantity)
+        .where(app_module.SizeQuantity.product_id == product_ids[0])
+        .values(quantity=10**6)
+    )
+
+    prices = dict(
+        db.session.query(app_module.Product.id, app_module.Product.selling_price).all()
+    )
+    costs = dict(
+        db.session.query(app_module.Product.id, app_module.Product.unit_cost).all()
+    )
+    now = datetime.now()
+    for start in range(0, args.sales, 10000):
+        batch = []
+        for _ in range(min(10000, args.sales - start)):
+            product_id = rnd.choice(product_ids)
+            batch.append(
+                {
+                    "product_id": product_id,
+                    "size": rnd.choice(sizes),
+                    "quantity": rnd.randint(1, 3),
+                    "selling_price": prices[product_id],
+                    "unit_cost": costs[product_id],
+                    "timestamp": now
+                    - timedelta(seconds=rnd.randint(0, args.days * 86400)),
+                }
+            )
+        db.session.execute(db.insert(app_module.Sale), batch)
+
+    reverted = rnd.sample(range(1, args.sales + 1), min(args.reverts, args.sales))
+    sales = {
+        sale.id: sale
+        for sale in app_module.Sale.query.filter(app_module.Sale.id.in_(reverted))
+    }
+    if sales:
+        db.session.execute(
+            db.insert(app_module.SaleRevert),
+            [
+                {
+                    "sale_id": sale.id,
+                    "product_id": sale.product_id,
+                    "size": sale.size,
+                    "quantity": sale.quantity,
+                    "selling_price": sale.selling_price,
+                    "unit_cost": sale.unit_cost,
+                    "reverted_by": admin.id,
+                    "revert_timestamp": sale.timestamp + timedelta(hours=1),
+                    "reason": "benchmark",
+                }
+                for sale in sales.values()
+            ],
+        )
+        db.session.execute(
+            db.update(app_module.Sale),
+            [
+                {"id": sale.id, "reverted_at": sale.timestamp + timedelta(hours=1)}
+                for sale in sales.values()
+            ],
+        )
+    db.session.commit()
+
+    # Derived tables the app keeps up to date on writes
+    app_module.rebuild_sales_rollup()
+    for start in range(0, len(product_ids), app_module.IMPORT_BATCH_SIZE):
+        app_module.refresh_search_documents(
+            product_ids[start : start + app_module.IMPORT_BATCH_SIZE]
+        )
+        app_module.refresh_stock_totals(
+            product_ids[start : start + app_module.IMPORT_BATCH_SIZE]
+        )
+    db.session.commit()
+
+    return product_ids
+
+
+def build_routes(product_ids, args):
+    """Route name -> (method, path, form data) driven by the benchmark"""
+    today = datetime.now().date()
+    year_ago = today - timedelta(days=365)
+    return {
+        # Runs without a session cookie, so every iteration verifies bcrypt
+        "login": (
+            "POST",
+            "/login",
+            {"username": "admin", "password": "admin123"},
+        ),
+        # Cheapest authenticated request: measures the session user lookup
+        "auth_request": ("GET", "/cache-stats", None),
+        "index": ("GET", "/", None),
+        "index_json": ("GET", "/?format=json", None),
+        "sell_page": ("GET", "/sell", None),
+        "sell": (
+            "POST",
+            "/sell",
+            {"product_id": product_ids[0], "size": SIZE_NAMES[0], "quantity": 1},
+        ),
+        "search_size": (
+            "POST",
+            "/search",
+            {"search_query": SIZE_NAMES[0], "search_type": "size"},
+        ),
+        "search_all": (
+            "POST",
+            "/search",
+            {"search_query": "winter", "search_type": "all"},
+        ),
+        "search_price": (
+            "POST",
+            "/search",
+            {"search_query": "15000", "search_type": "price"},
+        ),
+        "report_30d": ("GET", "/report", None),
+        "report_1y": (
+            "POST",
+            "/report",
+            {"start_date": year_ago.isoformat(), "end_date": today.isoformat()},
+        ),
+        "recent_sales": ("GET", "/recent-sales", None),
+        "revert_history": ("GET", "/revert-history", None),
+        "export_sales": ("GET", "/export", None),
+        "export_detailed_1y": (
+            "GET",
+            f"/export_detailed_report?start_date={year_ago}&end_date={today}",
+            None,
+        ),
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_route(app_module, client, method, path, data, args, query_log):
+    def request_once():
+        if args.cold_cache:
+            app_module.query_cache.invalidate()
+            app_module.user_cache.invalidate()
+        response = client.open(path, method=method, data=data)
+        body = response.get_data()  # Drains streamed exports
+        response.close()
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        return len(body)
+
+    for _ in range(args.warmup):
+        request_once()
+
+    latencies = []
+    queries = []
+    for _ in range(args.iterations):
+        query_log.clear()
+        start = time.perf_counter()
+        size = request_once()
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(query_log))
+
+    # Memory is measured on a separate request: tracemalloc slows Python down
+    tracemalloc.start()
+    request_once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": args.iterations,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p90_ms": round(percentile(latencies, 90), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "queries": round(statistics.mean(queries), 1),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "response_bytes": size,
+    }
+
+
+def git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    header = f"{'route':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'peak KB':>11}"
+    if baseline:
+        header += f"{'Δp50':>9}{'Δp95':>9}"
+    print(header)
+    for name, result in results.items():
+        line = (
+            f"{name:<22}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+            f"{result['p99_ms']:>10}{result['queries']:>9}{result['peak_memory_kb']:>11}"
+        )
+        before = (baseline or {}).get(name)
+        if before:
+            for key in ("p50_ms", "p95_ms"):
+                change = (result[key] - before[key]) / before[key] * 100
+                line += f"{change:>+8.0f}%"
+        print(line)
+
+
+def main():
+    args = parse_args()
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = "sqlite:///" + os.path.join(
+            tempfile.mkdtemp(prefix="zuzi_bench_"), "bench.db"
+        )
+    # app.py reads its configuration at import time
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    from sqlalchemy import event
+
+    app = app_module.app
+    app.config["REMEMBER_COOKIE_SECURE"] = False
+
+    with app.app_context():
+        print(f"Seeding {database_url} ...", file=sys.stderr)
+        started = time.perf_counter()
+        product_ids = seed_store(app_module, args)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        query_log = []
+        event.listen(
+            app_module.db.engine,
+            "before_cursor_execute",
+            lambda *a, **kw: query_log.append(1),
+        )
+
+    client = app.test_client()
+    client.post("/login", data={"username": "admin", "password": "admin123"})
+    anonymous_client = app.test_client(use_cookies=False)
+
+    routes = build_routes(product_ids, args)
+    if args.routes:
+        routes = {name: routes[name] for name in args.routes.split(",")}
+
+    results = {}
+    for name, (method, path, data) in routes.items():
+        print(f"Running {name} ...", file=sys.stderr)
+        results[name] = run_route(
+            app_module,
+            anonymous_client if name == "login" else client,
+            method,
+            path,
+            data,
+            args,
+            query_log,
+        )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    output = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "database": database_url.split(":")[0],
+            "cold_cache": args.cold_cache,
+            "bcrypt_log_rounds": app.config["BCRYPT_LOG_ROUNDS"],
+            "dataset": {
+                "products": args.products,
+                "sizes_per_product": args.sizes_per_product,
+                "sales": args.sales,
+                "reverts": args.reverts,
+                "days": args.days,
+                "seed": args.seed,
+            },
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Gunicorn settings, loaded automatically by `gunicorn app:app`."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+# Threaded workers: a slow report or export occupies one thread while the
+# others keep serving sells. Each thread checks out its own connection from
+# the worker's pool and its own scoped session (Flask-SQLAlchemy scopes the
+# session to the app context), so threads never share one.
+# gevent is not supported: psycopg2 would block the whole worker without
+# psycogreen.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Enough pooled connections that no thread waits on another's connection
+os.environ.setdefault("DB_POOL_SIZE", str(threads))
+
+# Every worker writes its Prometheus samples here; /metrics sums them up.
+# Must be set before the workers import app.py.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "zuzi_metrics")
+)
+
+
+def on_starting(server):
+    # Start from an empty directory so samples of a previous run don't count
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+# Background report workers (`flask report-worker`) run beside the web
+# workers, so the CSV files they write are on the disk the web workers serve
+report_workers = []
+stopping = threading.Event()
+
+
+def start_report_worker():
+    return subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "report-worker"]
+    )
+
+
+def watch_report_workers(server, mark_process_dead):
+    # Restarts report workers that exit, like the arbiter does for web
+    # workers. The arbiter's SIGCHLD handler may reap them first, poll() then
+    # gives a returncode of 0.
+    interval = int(os.environ.get("REPORT_WORKER_CHECK_SECONDS", 5))
+    while not stopping.wait(interval):
+        for i, process in enumerate(report_workers):
+            if process.poll() is None or stopping.is_set():
+                continue
+            server.log.warning(
+                "Report worker %s exited with %s, restarting",
+                process.pid,
+                process.returncode,
+            )
+            mark_process_dead(process.pid)
+            report_workers[i] = start_report_worker()
+
+
+def when_ready(server):
+    # Imported here, not in the thread: web workers forked while the thread
+    # held the module's import lock would deadlock importing app.py
+    from prometheus_client import multiprocess
+
+    for _ in range(int(os.environ.get("REPORT_WORKERS", 1))):
+        report_workers.append(start_report_worker())
+    threading.Thread(
+        target=watch_report_workers,
+        args=(server, multiprocess.mark_process_dead),
+        daemon=True,
+    ).start()
+
+
+def on_exit(server):
+    from prometheus_client import multiprocess
+
+    stopping.set()
+    for process in report_workers:
+        process.terminate()
+        process.wait()
+        multiprocess.mark_process_dead(process.pid)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,241 @@
+"""Load test sell throughput while reports and exports run in parallel.
+
+Seeds a throwaway SQLite database (see benchmark.py), starts gunicorn on it
+with gunicorn.conf.py and drives it over HTTP in two phases: sells only,
+then the same sells with report and export requests running alongside.
+Sell throughput and latency should stay roughly level across the phases.
+
+Usage:
+    python loadtest.py --duration 15 --sellers 4 --readers 4
+    python loadtest.py --worker-class sync --threads 1   # compare with sync
+    python loadtest.py --base-url http://localhost:8000  # an existing server
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+import benchmark
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per phase")
+    parser.add_argument("--sellers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument(
+        "--base-url",
+        help="load an already running server (logged in as admin/admin123)",
+    )
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--sizes-per-product", type=int, default=4)
+    parser.add_argument("--sales", type=int, default=20000)
+    parser.add_argument("--reverts", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+class Client:
+    """Keep-alive HTTP client holding a logged-in session cookie"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=300)
+        self.cookie = None
+
+    def request(self, method, path, form=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # The server closed the keep-alive connection; retry once
+            self.connection.close()
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        response.read()  # Drains streamed exports
+        cookie = response.getheader("Set-Cookie")
+        if cookie and cookie.startswith("session="):
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status
+
+    def login(self):
+        status = self.request(
+            "POST", "/login", {"username": "admin", "password": "admin123"}
+        )
+        if status != 302:
+            raise RuntimeError(f"Login failed with status {status}")
+        return self
+
+
+def seed_database(args):
+    """Seed a temporary SQLite database and return its URL"""
+    database_url = "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="zuzi_load_"), "load.db"
+    )
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+
+    with app_module.app.app_context():
+        product_ids = benchmark.seed_store(app_module, args)
+        # Leave the seeding connections behind before gunicorn forks off
+        app_module.db.engine.dispose()
+    return database_url, product_ids
+
+
+def start_server(args, database_url):
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_WORKER_CLASS=args.worker_class,
+        PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix="zuzi_load_metrics_"),
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            "gunicorn.conf.py",
+            "--bind",
+            f"127.0.0.1:{args.port}",
+            "app:app",
+        ],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    for _ in range(100):
+        try:
+            Client(base_url).request("GET", "/login")
+            return server, base_url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def run_phase(base_url, args, sell_form, with_readers):
+    stop = threading.Event()
+    sell_latencies = []
+    reads = []
+    errors = []
+
+    def seller():
+        client = Client(base_url).login()
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = client.request("POST", "/sell", sell_form)
+            sell_latencies.append(time.perf_counter() - start)
+            if status != 302:
+                errors.append(("sell", status))
+
+    today = datetime.now().date()
+    year_ago = today - timedelta(days=365)
+    read_requests = [
+        ("POST", "/report", {"start_date": str(year_ago), "end_date": str(today)}),
+        ("GET", "/export", None),
+        (
+            "GET",
+            f"/export_detailed_report?start_date={year_ago}&end_date={today}",
+            None,
+        ),
+        ("GET", "/recent-sales", None),
+    ]
+
+    def reader(offset):
+        client = Client(base_url).login()
+        i = offset
+        while not stop.is_set():
+            method, path, form = read_requests[i % len(read_requests)]
+            start = time.perf_counter()
+            status = client.request(method, path, form)
+            reads.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append((path, status))
+            i += 1
+
+    threads = [threading.Thread(target=seller) for _ in range(args.sellers)]
+    if with_readers:
+        threads += [
+            threading.Thread(target=reader, args=(i,)) for i in range(args.readers)
+        ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ordered = sorted(sell_latencies)
+    return {
+        "sells": len(ordered),
+        "sells_per_second": round(len(ordered) / args.duration, 1),
+        "sell_p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "sell_p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000, 1),
+        "reads": len(reads),
+        "read_mean_ms": round(statistics.mean(reads) * 1000, 1) if reads else None,
+        "errors": len(errors),
+    }
+
+
+def main():
+    args = parse_args()
+
+    server = None
+    base_url = args.base_url
+    sell_form = {"product_id": 1, "size": benchmark.SIZE_NAMES[0], "quantity": 1}
+    if not base_url:
+        print("Seeding ...", file=sys.stderr)
+        database_url, product_ids = seed_database(args)
+        sell_form["product_id"] = product_ids[0]
+        server, base_url = start_server(args, database_url)
+        print(
+            f"gunicorn: {args.workers} {args.worker_class} worker(s) x "
+            f"{args.threads} thread(s)",
+            file=sys.stderr,
+        )
+
+    try:
+        for name, with_readers in (("sells only", False), ("with reports", True)):
+            print(f"Running {name} for {args.duration:g}s ...", file=sys.stderr)
+            result = run_phase(base_url, args, sell_form, with_readers)
+            print(
+                f"{name:<14} {result['sells_per_second']:>8} sells/s  "
+                f"p50 {result['sell_p50_ms']:>7} ms  p95 {result['sell_p95_ms']:>7} ms  "
+                f"reads {result['reads']:>5} (mean {result['read_mean_ms']} ms)  "
+                f"errors {result['errors']}"
+            )
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Add report job claimed by
+
+Revision ID: 1cd288ce4b37
+Revises: a3089e4f9e35
+Create Date: 2026-10-18 10:01:49.712683
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1cd288ce4b37'
+down_revision = 'a3089e4f9e35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('report_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_by', sa.String(length=255), nullable=True))
+
+
+
+def downgrade():
+    with op.batch_alter_table('report_job', schema=None) as batch_op:
+        batch_op.drop_column('claimed_by')
+
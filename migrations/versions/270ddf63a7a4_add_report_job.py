@@ -0,0 +1,43 @@
+"""Add report job queue
+
+Revision ID: 270ddf63a7a4
+Revises: d2a94c71e6f3
+Create Date: 2026-10-18 09:22:41.649417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '270ddf63a7a4'
+down_revision = 'd2a94c71e6f3'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('report_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=True),
+    sa.Column('end_date', sa.Date(), nullable=True),
+    sa.Column('data_version', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('requested_by', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('file_name', sa.String(length=255), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['requested_by'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_report_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_report_job_status'))
+
+    op.drop_table('report_job')
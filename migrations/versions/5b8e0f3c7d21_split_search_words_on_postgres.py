@@ -0,0 +1,53 @@
+"""Split search document words on non-word characters on Postgres
+
+Revision ID: 5b8e0f3c7d21
+Revises: 1cd288ce4b37
+Create Date: 2026-10-18 11:02:37.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e0f3c7d21'
+down_revision = '1cd288ce4b37'
+branch_labels = None
+depends_on = None
+
+
+OLD_POSTGRES_SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple', coalesce(sizes, '')), 'A')"
+    " || setweight(to_tsvector('simple', coalesce(season, '')), 'B')"
+    " || setweight(to_tsvector('simple', coalesce(gender, '')), 'C')"
+    " || setweight(to_tsvector('simple', product_ref), 'D'))"
+)
+
+POSTGRES_SEARCH_VECTOR = (
+    r"(setweight(to_tsvector('simple',"
+    r" regexp_replace(coalesce(sizes, ''), '\W+', ' ', 'g')), 'A')"
+    r" || setweight(to_tsvector('simple',"
+    r" regexp_replace(coalesce(season, ''), '\W+', ' ', 'g')), 'B')"
+    r" || setweight(to_tsvector('simple',"
+    r" regexp_replace(coalesce(gender, ''), '\W+', ' ', 'g')), 'C')"
+    r" || setweight(to_tsvector('simple', product_ref), 'D'))"
+)
+
+
+def replace_search_index(vector):
+    # SQLite's FTS5 tokenizer already splits on punctuation
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_product_search_document_vector")
+    op.execute(
+        "CREATE INDEX ix_product_search_document_vector ON product_search_document "
+        f"USING gin ({vector})"
+    )
+
+
+def upgrade():
+    replace_search_index(POSTGRES_SEARCH_VECTOR)
+
+
+def downgrade():
+    replace_search_index(OLD_POSTGRES_SEARCH_VECTOR)
@@ -0,0 +1,47 @@
+"""Add reverted_at to sales with a partial index on live sales
+
+Revision ID: 724a674803f7
+Revises: d4d1521ae697
+Create Date: 2026-10-18 09:41:30.608868
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '724a674803f7'
+down_revision = 'd4d1521ae697'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reverted_at', sa.DateTime(), nullable=True))
+
+    # Backfill from the existing revert records
+    op.execute(
+        """
+        UPDATE sale
+        SET reverted_at = (
+            SELECT COALESCE(sale_revert.revert_timestamp, CURRENT_TIMESTAMP)
+            FROM sale_revert
+            WHERE sale_revert.sale_id = sale.id
+        )
+        WHERE EXISTS (
+            SELECT 1 FROM sale_revert WHERE sale_revert.sale_id = sale.id
+        )
+        """
+    )
+
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sale_timestamp'))
+        batch_op.create_index('ix_sale_live_timestamp', ['timestamp'], unique=False, sqlite_where=sa.text('reverted_at IS NULL'), postgresql_where=sa.text('reverted_at IS NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index('ix_sale_live_timestamp', sqlite_where=sa.text('reverted_at IS NULL'), postgresql_where=sa.text('reverted_at IS NULL'))
+        batch_op.create_index(batch_op.f('ix_sale_timestamp'), ['timestamp'], unique=False)
+        batch_op.drop_column('reverted_at')
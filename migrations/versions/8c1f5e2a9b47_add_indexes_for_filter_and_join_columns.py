@@ -0,0 +1,57 @@
+"""Add indexes for filter and join columns
+
+Revision ID: 8c1f5e2a9b47
+Revises: 4df24e9d8da9
+Create Date: 2026-10-18 09:12:41.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1f5e2a9b47'
+down_revision = '4df24e9d8da9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_season'), ['season'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_gender'), ['gender'], unique=False)
+
+    with op.batch_alter_table('size_quantity', schema=None) as batch_op:
+        batch_op.create_index('ix_size_quantity_product_id_size', ['product_id', 'size'], unique=False)
+
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sale_product_id'), ['product_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_sale_timestamp'), ['timestamp'], unique=False)
+
+    # Reverting used to check for an existing revert and then insert one, so
+    # a double submit could record a sale twice. Keep the first record.
+    op.execute(
+        "DELETE FROM sale_revert WHERE id NOT IN "
+        "(SELECT MIN(id) FROM sale_revert GROUP BY sale_id)"
+    )
+
+    with op.batch_alter_table('sale_revert', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_sale_revert_sale_id', ['sale_id'])
+        batch_op.create_index(batch_op.f('ix_sale_revert_revert_timestamp'), ['revert_timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sale_revert', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sale_revert_revert_timestamp'))
+        batch_op.drop_constraint('uq_sale_revert_sale_id', type_='unique')
+
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sale_timestamp'))
+        batch_op.drop_index(batch_op.f('ix_sale_product_id'))
+
+    with op.batch_alter_table('size_quantity', schema=None) as batch_op:
+        batch_op.drop_index('ix_size_quantity_product_id_size')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_gender'))
+        batch_op.drop_index(batch_op.f('ix_product_season'))
@@ -0,0 +1,41 @@
+"""Add catalog version counter and product versions
+
+Revision ID: 9d6fa3dda8c2
+Revises: 270ddf63a7a4
+Create Date: 2026-10-18 09:41:12.318529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d6fa3dda8c2'
+down_revision = '270ddf63a7a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        "INSERT INTO catalog_version (id, value, updated_at) "
+        "VALUES (1, 0, CURRENT_TIMESTAMP)"
+    )
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_product_version'), ['version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_version'))
+        batch_op.drop_column('version')
+
+    op.drop_table('catalog_version')
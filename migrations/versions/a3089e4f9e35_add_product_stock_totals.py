@@ -0,0 +1,48 @@
+"""Add per-product stock totals and a low-stock index
+
+Revision ID: a3089e4f9e35
+Revises: 724a674803f7
+Create Date: 2026-10-18 09:52:06.410238
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3089e4f9e35'
+down_revision = '724a674803f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_units', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the current size quantities
+    op.execute(
+        """
+        UPDATE product
+        SET total_units = (
+            SELECT COALESCE(SUM(size_quantity.quantity), 0)
+            FROM size_quantity
+            WHERE size_quantity.product_id = product.id
+        )
+        """
+    )
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_total_units'), ['total_units'], unique=False)
+
+    with op.batch_alter_table('size_quantity', schema=None) as batch_op:
+        batch_op.create_index('ix_size_quantity_quantity', ['quantity'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('size_quantity', schema=None) as batch_op:
+        batch_op.drop_index('ix_size_quantity_quantity')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_total_units'))
+        batch_op.drop_column('total_units')
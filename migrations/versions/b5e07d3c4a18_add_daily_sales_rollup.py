@@ -0,0 +1,54 @@
+"""Add daily sales rollup
+
+Revision ID: b5e07d3c4a18
+Revises: 8c1f5e2a9b47
+Create Date: 2026-10-18 11:47:03.602815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e07d3c4a18'
+down_revision = '8c1f5e2a9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sale_date', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('size', sa.String(length=50), nullable=True),
+    sa.Column('sales_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.Column('profit', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sale_date', 'product_id', 'size', name='uq_daily_sales_rollup_key')
+    )
+
+    # Backfill from existing non-reverted sales
+    op.execute(
+        """
+        INSERT INTO daily_sales_rollup
+            (sale_date, product_id, size, sales_count, units, revenue, cost, profit)
+        SELECT date(sale.timestamp), sale.product_id, sale.size,
+               count(sale.id), sum(sale.quantity),
+               sum(sale.selling_price * sale.quantity),
+               sum(sale.unit_cost * sale.quantity),
+               sum((sale.selling_price - sale.unit_cost) * sale.quantity)
+        FROM sale
+        LEFT OUTER JOIN sale_revert ON sale.id = sale_revert.sale_id
+        WHERE sale_revert.id IS NULL
+        GROUP BY date(sale.timestamp), sale.product_id, sale.size
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('daily_sales_rollup')
@@ -0,0 +1,90 @@
+"""Add product search document and full-text index
+
+Revision ID: d2a94c71e6f3
+Revises: b5e07d3c4a18
+Create Date: 2026-10-18 14:21:55.904137
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a94c71e6f3'
+down_revision = 'b5e07d3c4a18'
+branch_labels = None
+depends_on = None
+
+
+POSTGRES_SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple', coalesce(sizes, '')), 'A')"
+    " || setweight(to_tsvector('simple', coalesce(season, '')), 'B')"
+    " || setweight(to_tsvector('simple', coalesce(gender, '')), 'C')"
+    " || setweight(to_tsvector('simple', product_ref), 'D'))"
+)
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE product_search_fts USING fts5("
+    "season, gender, sizes, product_ref, "
+    "content='product_search_document', content_rowid='product_id')",
+    "CREATE TRIGGER product_search_document_ai AFTER INSERT ON "
+    "product_search_document BEGIN "
+    "INSERT INTO product_search_fts(rowid, season, gender, sizes, product_ref) "
+    "VALUES (new.product_id, new.season, new.gender, new.sizes, new.product_ref); "
+    "END",
+    "CREATE TRIGGER product_search_document_ad AFTER DELETE ON "
+    "product_search_document BEGIN "
+    "INSERT INTO product_search_fts"
+    "(product_search_fts, rowid, season, gender, sizes, product_ref) "
+    "VALUES ('delete', old.product_id, old.season, old.gender, old.sizes, "
+    "old.product_ref); "
+    "END",
+    "CREATE TRIGGER product_search_document_au AFTER UPDATE ON "
+    "product_search_document BEGIN "
+    "INSERT INTO product_search_fts"
+    "(product_search_fts, rowid, season, gender, sizes, product_ref) "
+    "VALUES ('delete', old.product_id, old.season, old.gender, old.sizes, "
+    "old.product_ref); "
+    "INSERT INTO product_search_fts(rowid, season, gender, sizes, product_ref) "
+    "VALUES (new.product_id, new.season, new.gender, new.sizes, new.product_ref); "
+    "END",
+]
+
+
+def upgrade():
+    op.create_table('product_search_document',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('product_ref', sa.String(length=20), nullable=False),
+    sa.Column('season', sa.String(length=50), nullable=True),
+    sa.Column('gender', sa.String(length=50), nullable=True),
+    sa.Column('sizes', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX ix_product_search_document_vector ON product_search_document "
+            f"USING gin ({POSTGRES_SEARCH_VECTOR})"
+        )
+        sizes_agg = "string_agg(size, ' ')"
+    else:
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+        sizes_agg = "group_concat(size, ' ')"
+
+    # Backfill one document per existing product (the triggers fill FTS5)
+    op.execute(
+        "INSERT INTO product_search_document "
+        "(product_id, product_ref, season, gender, sizes) "
+        "SELECT product.id, CAST(product.id AS VARCHAR(20)), product.season, "
+        f"product.gender, (SELECT {sizes_agg} FROM size_quantity "
+        "WHERE size_quantity.product_id = product.id) "
+        "FROM product"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS product_search_fts")
+    op.drop_table('product_search_document')
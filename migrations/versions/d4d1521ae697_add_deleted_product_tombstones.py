@@ -0,0 +1,33 @@
+"""Add deleted product tombstones for inventory sync
+
+Revision ID: d4d1521ae697
+Revises: 9d6fa3dda8c2
+Create Date: 2026-10-18 09:58:40.127604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4d1521ae697'
+down_revision = '9d6fa3dda8c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('deleted_product',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    with op.batch_alter_table('deleted_product', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_deleted_product_version'), ['version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('deleted_product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_deleted_product_version'))
+
+    op.drop_table('deleted_product')
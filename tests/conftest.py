@@ -0,0 +1,121 @@
+"""Shared fixtures: every test gets a freshly created database.
+
+The suite runs against a SQLite file in a temporary directory (a file rather
+than :memory:, so threads get their own connections and WAL applies). Set
+TEST_DATABASE_URL to run it against Postgres instead, e.g.
+postgresql+psycopg2://user@localhost/zuzi_test (with DATABASE_SSLMODE=disable
+for a local server).
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# app.py reads its settings at import time
+TEST_DIR = tempfile.mkdtemp(prefix="zuzi_tests_")
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL"
+) or "sqlite:///" + os.path.join(TEST_DIR, "test.db")
+os.environ["REPORT_JOB_DIR"] = os.path.join(TEST_DIR, "report_jobs")
+os.environ.setdefault("BCRYPT_LOG_ROUNDS", "4")
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+import app as app_module  # noqa: E402
+
+db = app_module.db
+
+
+def invalidate_caches():
+    for cache in (
+        app_module.query_cache,
+        app_module.user_cache,
+        app_module.fragment_cache,
+    ):
+        cache.invalidate()
+
+
+@pytest.fixture
+def app():
+    app_module.app.config["TESTING"] = True
+    with app_module.app.app_context():
+        db.drop_all()
+        app_module.init_db()
+    invalidate_caches()
+    yield app_module.app
+    with app_module.app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def login(app):
+    """Return a function giving a test client logged in as the admin"""
+
+    def login(username="admin", password="admin123"):
+        client = app.test_client()
+        response = client.post(
+            "/login", data={"username": username, "password": password}
+        )
+        assert response.status_code == 302
+        return client
+
+    return login
+
+
+@pytest.fixture
+def make_product(app):
+    """Return a function adding a product with {size: quantity} stock"""
+
+    def make_product(sizes=None, season="Summer", gender="Boys"):
+        sizes = {"2": 5, "4": 5} if sizes is None else sizes
+        with app.app_context():
+            product = app_module.Product(
+                image_url="https://example.com/image.jpg",
+                style_url="https://example.com/style",
+                total_cost=50000,
+                shipping_cost=5000,
+                unit_cost=5000,
+                selling_price=12000,
+                season=season,
+                gender=gender,
+            )
+            db.session.add(product)
+            db.session.flush()
+            db.session.add_all(
+                app_module.SizeQuantity(
+                    product_id=product.id, size=size, quantity=quantity
+                )
+                for size, quantity in sizes.items()
+            )
+            app_module.refresh_search_documents([product.id])
+            app_module.refresh_stock_totals([product.id])
+            app_module.bump_product_versions([product.id])
+            db.session.commit()
+            invalidate_caches()
+            return product.id
+
+    return make_product
+
+
+@pytest.fixture
+def capture_statements(app):
+    """Return a context manager collecting the (statement, parameters) run"""
+    with app.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def capture_statements():
+        statements = []
+
+        def record(connection, cursor, statement, parameters, context, many):
+            statements.append((statement, parameters))
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    return capture_statements
@@ -0,0 +1,26 @@
+import pytest
+
+from tests.conftest import invalidate_caches
+
+
+@pytest.mark.parametrize("path", ["/", "/sell", "/?season=Summer"])
+def test_query_count_does_not_grow_with_the_catalog(
+    path, login, make_product, capture_statements
+):
+    client = login()
+    counts = []
+    product_count = 0
+    # Both sizes fit on one index page, so every product is rendered
+    for target in (3, 40):
+        while product_count < target:
+            make_product(sizes={"2": 1, "4": 0, "6": 3})
+            product_count += 1
+        # Warm the per-user caches, then measure an uncached render
+        assert client.get(path).status_code == 200
+        invalidate_caches()
+        with capture_statements() as statements:
+            response = client.get(path)
+        assert response.status_code == 200
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1], counts
@@ -0,0 +1,97 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.conftest import app_module, db
+
+
+def explain(statement, parameters):
+    """The plan lines of a captured statement, on SQLite or Postgres"""
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        # The test tables are small enough that Postgres would rather read
+        # them whole; ask for the plan it uses on a real sized table
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return [row[-1] for row in rows]
+
+
+def scans_whole_table(plan, table):
+    pattern = re.compile(rf"^(SCAN {table}\b|.*Seq Scan on {table}\b)")
+    return any(pattern.match(line.strip()) for line in plan)
+
+
+@pytest.fixture
+def sales_history(app, make_product):
+    product_ids = [make_product(sizes={"2": 100, "4": 100}) for _ in range(10)]
+    now = datetime.now()
+    with app.app_context():
+        db.session.execute(
+            db.insert(app_module.Sale),
+            [
+                {
+                    "product_id": product_ids[i % len(product_ids)],
+                    "size": "2" if i % 3 else "4",
+                    "quantity": 1 + i % 2,
+                    "selling_price": 12000,
+                    "unit_cost": 5000,
+                    "timestamp": now - timedelta(hours=3 * i),
+                    # A few reverted sales, which the partial index leaves out
+                    "reverted_at": now if i % 25 == 0 else None,
+                }
+                for i in range(600)
+            ],
+        )
+        db.session.commit()
+        app_module.rebuild_sales_rollup()
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+
+def plans_for(app, statements, table):
+    with app.app_context():
+        plans = [
+            explain(statement, parameters)
+            for statement, parameters in statements
+            if re.search(rf"\b{table}\b", statement)
+        ]
+        db.session.rollback()
+    return plans
+
+
+def test_recent_sales_use_the_live_sales_index(
+    app, login, sales_history, capture_statements
+):
+    client = login()
+    with capture_statements() as statements:
+        assert client.get("/recent-sales").status_code == 200
+
+    plans = plans_for(app, statements, "sale")
+    assert plans
+    for plan in plans:
+        assert not scans_whole_table(plan, "sale"), plan
+        assert any("ix_sale_live_timestamp" in line for line in plan), plan
+
+
+def test_report_reads_the_rollup_by_date(app, login, sales_history, capture_statements):
+    client = login()
+    end = datetime.now()
+    with capture_statements() as statements:
+        response = client.post(
+            "/report",
+            data={
+                "start_date": (end - timedelta(days=14)).strftime("%Y-%m-%d"),
+                "end_date": end.strftime("%Y-%m-%d"),
+            },
+        )
+    assert response.status_code == 200
+
+    rollup_plans = plans_for(app, statements, "daily_sales_rollup")
+    assert rollup_plans
+    for plan in rollup_plans:
+        assert not scans_whole_table(plan, "daily_sales_rollup"), plan
+    for plan in plans_for(app, statements, "sale"):
+        assert not scans_whole_table(plan, "sale"), plan
@@ -0,0 +1,71 @@
+import pytest
+
+from tests.conftest import app_module, db
+
+on_postgres = pytest.mark.skipif(
+    not app_module.app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgres"),
+    reason="set TEST_DATABASE_URL to a Postgres database",
+)
+
+
+@pytest.fixture
+def catalog(app, make_product):
+    return {
+        "spring": make_product(
+            sizes={"2-3Y": 1, "10": 2}, season="Spring/Autumn", gender="Girls"
+        ),
+        "summer": make_product(sizes={"6/7": 1}, season="Summer", gender="Boys"),
+        "sold_out": make_product(sizes={"4": 0}, season="Winter", gender="Boys"),
+    }
+
+
+# Punctuated values have to split into the same words on both backends
+@pytest.mark.parametrize(
+    "search_query, search_type, expected",
+    [
+        ("Spring/Autumn", "season", ["spring"]),
+        ("autumn", "season", ["spring"]),
+        ("spring", "all", ["spring"]),
+        ("2-3Y", "size", ["spring"]),
+        ("3y", "size", ["spring"]),
+        ("6/7", "size", ["summer"]),
+        ("7", "size", ["summer"]),
+        ("boys", "gender", ["summer"]),
+        ("winter", "season", []),
+        ("autumn", "gender", []),
+    ],
+)
+def test_search_splits_words_on_punctuation(
+    app, catalog, search_query, search_type, expected
+):
+    with app.app_context():
+        found = app_module.search_product_ids(search_query, search_type)
+    assert found == [catalog[name] for name in expected]
+
+
+def test_search_matches_a_product_id(app, catalog):
+    with app.app_context():
+        found = app_module.search_product_ids(str(catalog["summer"]), "all")
+    assert catalog["summer"] in found
+
+
+def test_search_page_lists_the_matches(login, catalog):
+    response = login().post(
+        "/search", data={"search_query": "autumn", "search_type": "season"}
+    )
+    assert response.status_code == 200
+    assert "Spring/Autumn" in response.get_data(as_text=True)
+
+
+@on_postgres
+def test_search_uses_the_gin_index(app, catalog):
+    with app.app_context():
+        connection = db.session.connection()
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = connection.exec_driver_sql(
+            "EXPLAIN SELECT product_id FROM product_search_document"
+            f" WHERE {app_module.POSTGRES_SEARCH_VECTOR}"
+            " @@ to_tsquery('simple', 'autumn:*B')"
+        ).fetchall()
+        db.session.rollback()
+    assert any("ix_product_search_document_vector" in row[0] for row in plan), plan
@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+
+import pytest
+
+from tests.conftest import app_module, db
+
+on_sqlite = pytest.mark.skipif(
+    not app_module.app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"),
+    reason="SQLite connection settings",
+)
+
+
+def pragma(name):
+    return db.session.execute(db.text(f"PRAGMA {name}")).scalar()
+
+
+@on_sqlite
+def test_connections_use_wal(app):
+    with app.app_context():
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == app.config["SQLITE_BUSY_TIMEOUT_MS"]
+
+
+@on_sqlite
+def test_sell_commits_while_a_reader_is_open(app, login, make_product):
+    product_id = make_product(sizes={"2": 5})
+    with app.app_context():
+        path = db.engine.url.database
+    client = login()
+
+    # A long report or export holding its read transaction open; with a
+    # rollback journal the sell's commit would wait for it to finish
+    reader = sqlite3.connect(path, isolation_level=None)
+    try:
+        reader.execute("BEGIN")
+        select = "SELECT quantity FROM size_quantity WHERE product_id = ?"
+        assert reader.execute(select, (product_id,)).fetchone() == (5,)
+
+        response = client.post(
+            "/sell", data={"product_id": product_id, "size": "2", "quantity": 1}
+        )
+        assert response.status_code == 302
+
+        # The reader keeps its snapshot until it ends its transaction
+        assert reader.execute(select, (product_id,)).fetchone() == (5,)
+        reader.execute("COMMIT")
+        assert reader.execute(select, (product_id,)).fetchone() == (4,)
+    finally:
+        reader.close()
+
+
+def test_pages_stay_available_during_sells(app, login, make_product):
+    product_ids = [make_product(sizes={"2": 50, "4": 50}) for _ in range(5)]
+    errors = []
+    sells = []
+
+    def seller(index):
+        client = login()
+        for i in range(15):
+            response = client.post(
+                "/sell",
+                data={
+                    "product_id": product_ids[(index + i) % len(product_ids)],
+                    "size": "2",
+                    "quantity": 1,
+                },
+            )
+            if response.status_code != 302:
+                errors.append(("/sell", response.status_code))
+            sells.append(1)
+
+    def reader(index):
+        client = login()
+        for _ in range(5):
+            for path in ("/", "/sell", "/recent-sales", "/report", "/api/inventory"):
+                response = client.get(path)
+                if response.status_code != 200:
+                    errors.append((path, response.status_code))
+
+    threads = [threading.Thread(target=seller, args=(i,)) for i in range(4)] + [
+        threading.Thread(target=reader, args=(i,)) for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors
+    with app.app_context():
+        in_stock = db.session.query(db.func.sum(app_module.SizeQuantity.quantity))
+        sold = db.session.query(db.func.sum(app_module.Sale.quantity))
+        assert in_stock.scalar() + sold.scalar() == 500
+        assert sold.scalar() == len(sells)
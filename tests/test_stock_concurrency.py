@@ -0,0 +1,126 @@
+import threading
+
+from tests.conftest import app_module, db
+
+THREADS = 8
+ATTEMPTS = 10
+
+
+def run_threads(target, count=THREADS):
+    errors = []
+
+    def run(index):
+        try:
+            target(index)
+        except Exception as e:  # Reported by the test, not lost in the thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+
+
+def stock(product_id, size):
+    return (
+        app_module.SizeQuantity.query.filter_by(product_id=product_id, size=size)
+        .one()
+        .quantity
+    )
+
+
+def units_sold(product_id):
+    return (
+        db.session.query(db.func.coalesce(db.func.sum(app_module.Sale.quantity), 0))
+        .filter(
+            app_module.Sale.product_id == product_id,
+            app_module.Sale.reverted_at.is_(None),
+        )
+        .scalar()
+    )
+
+
+def test_parallel_sells_never_oversell(app, login, make_product):
+    product_id = make_product(sizes={"4": 25})
+    clients = [login() for _ in range(THREADS)]
+    statuses = []
+
+    def sell(index):
+        for _ in range(ATTEMPTS):
+            response = clients[index].post(
+                "/sell", data={"product_id": product_id, "size": "4", "quantity": 1}
+            )
+            statuses.append(response.status_code)
+
+    run_threads(sell)
+
+    assert set(statuses) == {302}
+    with app.app_context():
+        assert stock(product_id, "4") == 0
+        assert units_sold(product_id) == 25
+        product = db.session.get(app_module.Product, product_id)
+        assert product.total_units == 0
+
+
+def test_parallel_checkouts_sell_whole_carts_only(app, login, make_product):
+    first = make_product(sizes={"2": 30})
+    second = make_product(sizes={"2": 30})
+    clients = [login() for _ in range(THREADS)]
+    statuses = []
+
+    def checkout(index):
+        # Half the carts list the products in the opposite order
+        cart = [first, second] if index % 2 else [second, first]
+        for _ in range(ATTEMPTS):
+            response = clients[index].post(
+                "/sell/checkout",
+                json={
+                    "items": [
+                        {"product_id": product_id, "size": "2", "quantity": 1}
+                        for product_id in cart
+                    ]
+                },
+            )
+            statuses.append(response.status_code)
+
+    run_threads(checkout)
+
+    assert set(statuses) <= {200, 409}
+    assert statuses.count(200) == 30
+    with app.app_context():
+        for product_id in (first, second):
+            assert stock(product_id, "2") == 0
+            assert units_sold(product_id) == 30
+
+
+def test_reverts_racing_sells_keep_stock_consistent(app, login, make_product):
+    product_id = make_product(sizes={"6": 20})
+    admin = login()
+    for _ in range(10):
+        admin.post("/sell", data={"product_id": product_id, "size": "6", "quantity": 1})
+    with app.app_context():
+        sale_ids = [sale.id for sale in app_module.Sale.query]
+    clients = [login() for _ in range(THREADS)]
+
+    def sell_or_revert(index):
+        client = clients[index]
+        if index % 2:
+            for sale_id in sale_ids[index // 2 :: THREADS // 2]:
+                client.post(f"/revert-sale/{sale_id}", data={"reason": "test"})
+        else:
+            for _ in range(ATTEMPTS):
+                client.post(
+                    "/sell", data={"product_id": product_id, "size": "6", "quantity": 1}
+                )
+
+    run_threads(sell_or_revert)
+
+    with app.app_context():
+        reverted = app_module.Sale.query.filter(
+            app_module.Sale.id.in_(sale_ids), app_module.Sale.reverted_at.isnot(None)
+        ).count()
+        assert reverted == len(sale_ids)
+        assert stock(product_id, "6") + units_sold(product_id) == 20
+        assert stock(product_id, "6") >= 0